@@ -0,0 +1,206 @@
+"""
+Write batching for hot admin and user flows.
+Coalesces rapid database writes into a single SQLite transaction.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewBatcher:
+    """
+    Applies a lone accept/reject immediately; when reviews are already
+    queued, groups them (and those arriving within a short window) and
+    commits them with one db.apply_reviews call.
+    """
+
+    def __init__(self, flush_ms: int = 100):
+        """
+        Args:
+            flush_ms: How long to keep collecting once a burst of reviews is queued
+        """
+        self.flush_delay = flush_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # items taken off the queue by a worker that was cancelled before flushing
+        self._unflushed: List = []
+
+    def _ensure_worker(self) -> None:
+        """Start the background flush task on first use"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, pid: int, action: str, reviewer_id: int) -> bool:
+        """
+        Queue a review and wait until its batch is committed.
+
+        Returns:
+            True if applied, False if the profile was already reviewed
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((pid, action, reviewer_id, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            flushing = False
+            try:
+                self._drain(batch)
+                if len(batch) > 1:
+                    # burst in progress: keep collecting for the window;
+                    # a lone review is applied right away
+                    deadline = loop.time() + self.flush_delay
+                    while True:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                        except asyncio.TimeoutError:
+                            break
+                flushing = True
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                if not flushing:
+                    # not applied yet: close() flushes these with the queue
+                    self._unflushed.extend(batch)
+                else:
+                    # the transaction may or may not have committed
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(RuntimeError('Review batch interrupted by shutdown'))
+                raise
+
+    def _drain(self, batch: List[Tuple]) -> None:
+        """Move everything already queued into batch without waiting"""
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _flush(self, batch: List[Tuple]) -> None:
+        """Apply collected reviews in one transaction and resolve their futures"""
+        reviews = [item[:3] for item in batch]
+        try:
+            results = await asyncio.to_thread(db.apply_reviews, reviews)
+        except Exception as e:
+            logger.exception('Failed to apply %d batched reviews', len(batch))
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), ok in zip(batch, results):
+            if not future.done():
+                future.set_result(ok)
+        logger.debug('Applied %d reviews in one transaction', len(batch))
+
+    async def close(self) -> None:
+        """Stop the worker and apply anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        pending, self._unflushed = self._unflushed, []
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+
+
+class ReportsWriter:
+    """
+    Write-behind queue for reports (AFK requests, admin applications).
+    Callers return as soon as the report is queued; a background task
+    inserts queued reports with one db.add_reports call per batch.
+    """
+
+    def __init__(self, max_batch: int = 100, flush_ms: int = 500):
+        """
+        Args:
+            max_batch: Max reports inserted per transaction
+            flush_ms: Max time a queued report waits before being written
+        """
+        self.max_batch = max_batch
+        self.flush_delay = flush_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # items taken off the queue by a worker that was cancelled before flushing
+        self._unflushed: List = []
+
+    def _ensure_worker(self) -> None:
+        """Start the background flush task on first use"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, report: Dict[str, Any]) -> None:
+        """Queue a report for insertion (returns when enqueued, not when committed)"""
+        self._ensure_worker()
+        await self._queue.put(report)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = loop.time() + self.flush_delay
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # not written yet: close() flushes these with the queue
+                self._unflushed.extend(batch)
+                raise
+            # a cancel during the insert leaves the worker thread to finish it
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert collected reports in one transaction"""
+        try:
+            await asyncio.to_thread(db.add_reports, batch)
+            logger.debug('Wrote %d reports in one transaction', len(batch))
+        except Exception:
+            logger.exception('Failed to write %d queued reports', len(batch))
+
+    async def close(self) -> None:
+        """Stop the worker and write anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        pending, self._unflushed = self._unflushed, []
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+
+
+# Global write batchers
+review_batcher = ReviewBatcher(flush_ms=100)
+reports_writer = ReportsWriter()
@@ -1,9 +1,12 @@
 """
-Persistent cache manager for profiles with JSON storage.
+Persistent cache manager for profiles with JSON storage,
+or Redis (msgpack + zstd) when REDIS_URL is configured.
 Ensures new profiles are preserved after bot restart.
 """
 import json
 import logging
+import os
+import re
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
@@ -18,18 +21,25 @@ _lock = Lock()
 class PersistentProfileCache:
     """
     Manages profile caching with JSON persistence.
-    Automatically saves new profiles to disk for recovery after restart.
+    Mutations are appended to a JSON-lines log (one small write each);
+    the full JSON snapshot is rewritten only on compaction.
     """
     
+    # Rewrite the snapshot and truncate the log after this many appends
+    COMPACT_EVERY = 500
+    
     def __init__(self, cache_file: str = None):
         self.cache_file = cache_file or config.PROFILE_CACHE_FILE
+        self.log_file = self.cache_file + '.log'
         self.cache: Dict[int, Dict[str, Any]] = {}
         self.timestamps: Dict[int, datetime] = {}
         self.ttl = config.PROFILE_CACHE_TTL
+        self._log_fd: Optional[int] = None
+        self._log_writes = 0
         self._load_from_disk()
     
     def _load_from_disk(self) -> None:
-        """Load cache from JSON file on startup"""
+        """Load snapshot and replay the log on startup"""
         with _lock:
             try:
                 cache_path = Path(self.cache_file)
@@ -39,18 +49,79 @@ class PersistentProfileCache:
                         self.cache = data.get('cache', {})
                         # Convert string keys back to integers
                         self.cache = {int(k): v for k, v in self.cache.items()}
-                        logger.info(f'Loaded {len(self.cache)} profiles from cache file')
-                        
-                        # Initialize timestamps
-                        for pid in self.cache:
-                            self.timestamps[pid] = datetime.now()
+                replayed = self._replay_log()
+                logger.info(f'Loaded {len(self.cache)} profiles from cache file ({replayed} log entries replayed)')
+                
+                # Initialize timestamps
+                for pid in self.cache:
+                    self.timestamps[pid] = datetime.now()
             except Exception as e:
                 logger.warning(f'Failed to load cache from disk: {e}')
                 self.cache = {}
                 self.timestamps = {}
+        # Start from a compact state so the log only holds this run's changes
+        if Path(self.log_file).exists():
+            self.compact()
     
-    def _save_to_disk(self) -> None:
-        """Persist cache to JSON file"""
+    def _replay_log(self) -> int:
+        """Apply logged mutations on top of the snapshot"""
+        log_path = Path(self.log_file)
+        if not log_path.exists():
+            return 0
+        count = 0
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    op = rec.get('op')
+                    if op == 'set':
+                        self.cache[int(rec['k'])] = rec['v']
+                    elif op == 'update':
+                        pid = int(rec['k'])
+                        if pid in self.cache:
+                            self.cache[pid].update(rec['v'])
+                    elif op == 'del':
+                        self.cache.pop(int(rec['k']), None)
+                    elif op == 'clear':
+                        self.cache.clear()
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # torn write from a crash or a corrupt record: skip it,
+                    # the rest of the log is still applied
+                    logger.warning('Skipping malformed cache log line')
+                    continue
+                count += 1
+        return count
+    
+    def _append_log(self, record: Dict[str, Any]) -> None:
+        """Append one mutation record; call with _lock held"""
+        try:
+            if self._log_fd is None:
+                Path(self.log_file).parent.mkdir(parents=True, exist_ok=True)
+                self._log_fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._log_fd, (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            self._log_writes += 1
+        except Exception as e:
+            logger.error(f'Failed to append to cache log: {e}')
+    
+    def _maybe_compact(self) -> None:
+        if self._log_writes >= self.COMPACT_EVERY:
+            self.compact()
+    
+    def compact(self) -> None:
+        """Write a fresh snapshot and truncate the log"""
+        with _lock:
+            if self._save_to_disk():
+                try:
+                    if self._log_fd is not None:
+                        os.ftruncate(self._log_fd, 0)
+                    else:
+                        open(self.log_file, 'w').close()
+                except Exception as e:
+                    logger.error(f'Failed to truncate cache log: {e}')
+                self._log_writes = 0
+    
+    def _save_to_disk(self) -> bool:
+        """Persist cache snapshot to JSON file (atomic replace)"""
         try:
             cache_path = Path(self.cache_file)
             cache_path.parent.mkdir(parents=True, exist_ok=True)
@@ -61,10 +132,14 @@ class PersistentProfileCache:
                 'saved_at': datetime.now().isoformat()
             }
             
-            with open(cache_path, 'w', encoding='utf-8') as f:
+            tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, cache_path)
+            return True
         except Exception as e:
             logger.error(f'Failed to save cache to disk: {e}')
+            return False
     
     def get(self, pid: int) -> Optional[Dict[str, Any]]:
         """Get profile from cache if not expired"""
@@ -87,7 +162,8 @@ class PersistentProfileCache:
         with _lock:
             self.cache[pid] = profile
             self.timestamps[pid] = datetime.now()
-        self._save_to_disk()
+            self._append_log({'op': 'set', 'k': pid, 'v': profile})
+        self._maybe_compact()
     
     def update(self, pid: int, updates: Dict[str, Any]) -> None:
         """Update specific fields of a cached profile"""
@@ -95,7 +171,8 @@ class PersistentProfileCache:
             if pid in self.cache:
                 self.cache[pid].update(updates)
                 self.timestamps[pid] = datetime.now()
-        self._save_to_disk()
+                self._append_log({'op': 'update', 'k': pid, 'v': updates})
+        self._maybe_compact()
     
     def invalidate(self, pid: int) -> None:
         """Remove profile from cache"""
@@ -104,7 +181,8 @@ class PersistentProfileCache:
                 del self.cache[pid]
             if pid in self.timestamps:
                 del self.timestamps[pid]
-        self._save_to_disk()
+            self._append_log({'op': 'del', 'k': pid})
+        self._maybe_compact()
     
     def delete(self, username: str) -> None:
         """Delete profile from cache by username"""
@@ -115,15 +193,17 @@ class PersistentProfileCache:
                     del self.cache[pid]
                 if pid in self.timestamps:
                     del self.timestamps[pid]
+                self._append_log({'op': 'del', 'k': pid})
         if pids_to_delete:
-            self._save_to_disk()
+            self._maybe_compact()
     
     def invalidate_all(self) -> None:
         """Clear entire cache"""
         with _lock:
             self.cache.clear()
             self.timestamps.clear()
-        self._save_to_disk()
+            self._append_log({'op': 'clear'})
+        self._maybe_compact()
     
     def get_all(self) -> List[Dict[str, Any]]:
         """Get all cached profiles (not expired)"""
@@ -151,7 +231,163 @@ class PersistentProfileCache:
     def exists(self, pid: int) -> bool:
         """Check if profile exists in cache and not expired"""
         return self.get(pid) is not None
+    
+    def __len__(self) -> int:
+        return len(self.cache)
+    
+    def close(self) -> None:
+        """Compact and release the log file (call on shutdown)"""
+        self.compact()
+        with _lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+                self._log_fd = None
+
+
+class RedisProfileCache:
+    """
+    Profile cache stored in Redis, shared between bot processes.
+    Entries are msgpack-encoded, zstd-compressed and expire after the TTL.
+    Same interface as PersistentProfileCache. Methods block on network round
+    trips, so async code calls them through asyncio.to_thread.
+    """
+    
+    # Key templates; every key is namespaced with the instance prefix
+    KEY = 'profile:{}'
+    USER_KEY = 'profile_user:{}'
+    
+    def __init__(self, url: str, client=None, prefix: Optional[str] = None):
+        """
+        Args:
+            url: Redis URL (config.REDIS_URL)
+            client: Ready redis client to use instead of connecting to url
+            prefix: Key namespace (config.REDIS_KEY_PREFIX by default)
+        """
+        # Optional dependencies: only needed when REDIS_URL is set
+        import msgpack
+        import redis
+        import zstandard
+        
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+        self._compress = zstandard.ZstdCompressor().compress
+        self._decompress = zstandard.ZstdDecompressor().decompress
+        self._watch_error = redis.WatchError
+        if client is None:
+            # bounded timeouts: an unreachable host must not hang startup or handlers
+            client = redis.Redis.from_url(
+                url,
+                socket_connect_timeout=config.REDIS_TIMEOUT_SECONDS,
+                socket_timeout=config.REDIS_TIMEOUT_SECONDS,
+            )
+        self.r = client
+        self.r.ping()
+        self.prefix = config.REDIS_KEY_PREFIX if prefix is None else prefix
+        # braces doubled so a hash-tag prefix like '{tgbot}:' survives str.format
+        fmt_prefix = self.prefix.replace('{', '{{').replace('}', '}}')
+        self._key = fmt_prefix + self.KEY
+        self._user_key = fmt_prefix + self.USER_KEY
+        # SCAN patterns only match this namespace (glob chars in the prefix escaped)
+        glob_prefix = re.sub(r'([*?\[\]\\])', r'\\\1', self.prefix)
+        self._profile_pattern = glob_prefix + 'profile:*'
+        self._user_pattern = glob_prefix + 'profile_user:*'
+        self.ttl = config.PROFILE_CACHE_TTL
+        # Kept for API compatibility; this backend never writes the file
+        self.cache_file = config.PROFILE_CACHE_FILE
+    
+    def _dump(self, profile: Dict[str, Any]) -> bytes:
+        return self._compress(self._packb(profile))
+    
+    def _load(self, raw: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        if raw is None:
+            return None
+        return self._unpackb(self._decompress(raw))
+    
+    def _write(self, pipe, pid: int, profile: Dict[str, Any]) -> None:
+        pipe.setex(self._key.format(pid), self.ttl, self._dump(profile))
+        if profile.get('username'):
+            user_key = self._user_key.format(profile['username'])
+            pipe.sadd(user_key, pid)
+            pipe.expire(user_key, self.ttl)
+    
+    def get(self, pid: int) -> Optional[Dict[str, Any]]:
+        """Get profile from cache if not expired"""
+        return self._load(self.r.get(self._key.format(pid)))
+    
+    def set(self, pid: int, profile: Dict[str, Any]) -> None:
+        """Set profile in cache"""
+        pipe = self.r.pipeline()
+        self._write(pipe, pid, profile)
+        pipe.execute()
+    
+    def update(self, pid: int, updates: Dict[str, Any]) -> None:
+        """Update specific fields of a cached profile (atomic read-modify-write)"""
+        key = self._key.format(pid)
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    profile = self._load(pipe.get(key))
+                    if profile is None:
+                        return
+                    profile.update(updates)
+                    pipe.multi()
+                    self._write(pipe, pid, profile)
+                    pipe.execute()
+                    return
+                except self._watch_error:
+                    continue
+    
+    def invalidate(self, pid: int) -> None:
+        """Remove profile from cache"""
+        self.r.delete(self._key.format(pid))
+    
+    def delete(self, username: str) -> None:
+        """Delete profile from cache by username"""
+        user_key = self._user_key.format(username)
+        pids = self.r.smembers(user_key)
+        if pids:
+            self.r.delete(user_key, *(self._key.format(int(p)) for p in pids))
+    
+    def _keys(self, pattern: str) -> List[bytes]:
+        return list(self.r.scan_iter(match=pattern, count=500))
+    
+    def invalidate_all(self) -> None:
+        """Clear entire cache"""
+        keys = self._keys(self._profile_pattern) + self._keys(self._user_pattern)
+        if keys:
+            self.r.delete(*keys)
+    
+    def get_all(self) -> List[Dict[str, Any]]:
+        """Get all cached profiles (not expired)"""
+        keys = self._keys(self._profile_pattern)
+        if not keys:
+            return []
+        return [p for p in map(self._load, self.r.mget(keys)) if p is not None]
+    
+    def exists(self, pid: int) -> bool:
+        """Check if profile exists in cache and not expired"""
+        return bool(self.r.exists(self._key.format(pid)))
+    
+    def __len__(self) -> int:
+        return len(self._keys(self._profile_pattern))
+    
+    def close(self) -> None:
+        """Release the connection pool (Redis persists on its own)"""
+        self.r.close()
+
+
+def _create_profile_cache():
+    """Use Redis when configured and reachable, the JSON file cache otherwise"""
+    if config.REDIS_URL:
+        try:
+            cache = RedisProfileCache(config.REDIS_URL)
+            logger.info('Using Redis profile cache')
+            return cache
+        except Exception as e:
+            logger.warning('Redis profile cache unavailable, falling back to JSON file: %s', e)
+    return PersistentProfileCache()
 
 
 # Global cache instance
-profile_cache = PersistentProfileCache()
+profile_cache = _create_profile_cache()
@@ -62,9 +62,15 @@ RATE_LIMIT_WINDOW = 1  # seconds
 # Cache settings
 PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))  # 5 minutes
 PROFILE_CACHE_FILE = os.path.join(CACHE_DIR, "profiles_cache.json")
+# optional shared cache (e.g. redis://localhost:6379/0); JSON file cache is used when unset
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "tgbot:")  # namespace for this bot's keys
+REDIS_TIMEOUT_SECONDS = float(os.getenv("REDIS_TIMEOUT_SECONDS", "2"))  # connect and socket timeout
 
 # Validation settings
 MIN_PROFILE_LENGTH = 10
 MAX_PROFILE_LENGTH = 5000
 MAX_RETRIES_TELEGRAM = 3
 RETRY_BACKOFF_FACTOR = 2
+MAX_RETRY_AFTER_SECONDS = int(os.getenv("MAX_RETRY_AFTER_SECONDS", "30"))  # cap on Telegram flood-wait sleeps
+ADMIN_EDIT_TIMEOUT_SECONDS = int(os.getenv("ADMIN_EDIT_TIMEOUT_SECONDS", "600"))  # idle admin edit session expiry
@@ -1,15 +1,21 @@
 import sqlite3
-from typing import Any, Dict, List, Optional
-from datetime import datetime
-from threading import Lock
-from config import DB_PATH
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from threading import RLock
+import config
+from utils import iso_now
 
-_lock = Lock()
+# reentrant so init_db can seed on the connection it already holds
+_lock = RLock()
 
 
-def _connect():
-    """Create optimized SQLite connection for concurrent access"""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10.0)
+def get_conn(path: Optional[str] = None) -> sqlite3.Connection:
+    """Create optimized SQLite connection for concurrent access (defaults to config.DB_PATH).
+
+    Paths are opened with uri=True, so 'file:...?mode=memory&cache=shared' gives a shared
+    in-memory database; plain file paths behave as before.
+    """
+    conn = sqlite3.connect(path or config.DB_PATH, check_same_thread=False, timeout=10.0, uri=True)
     conn.row_factory = sqlite3.Row
     # WAL mode enables concurrent reads without blocking writes
     conn.execute("PRAGMA journal_mode=WAL")
@@ -22,9 +28,22 @@ def _connect():
     return conn
 
 
-def init_db() -> None:
+@contextmanager
+def _session(conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """Hold the module lock and yield conn, or a fresh connection that is closed afterwards"""
     with _lock:
-        conn = _connect()
+        if conn is not None:
+            yield conn
+            return
+        conn = get_conn()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def init_db(conn: Optional[sqlite3.Connection] = None) -> None:
+    with _session(conn) as conn:
         cur = conn.cursor()
         # profiles table
         cur.execute(
@@ -101,12 +120,11 @@ def init_db() -> None:
             pass
         
         conn.commit()
-        conn.close()
-    # seed initial data
-    _seed_profiles()
+        # seed initial data
+        _seed_profiles(conn)
 
 
-def _seed_profiles() -> None:
+def _seed_profiles(conn: Optional[sqlite3.Connection] = None) -> None:
     seed = [
         {"username": "thebitsamuraiizz", "age": 13, "name": None, "country": "Азербайджан", "city": "Баку", "timezone": "UTC+4", "tz_offset": 4, "languages": "Русский, Английский, Азербайджанский", "note": "☆ 𝕋𝕙𝕖 𝔹𝕚𝕥𝕤𝕒𝕞𝕦𝕣𝕒𝕚𝕚𝕫𝕫 ☆ — декоративный стиль"},
         {
@@ -130,8 +148,7 @@ def _seed_profiles() -> None:
         {"username": "denji_kuni", "age": 12, "name": None, "country": "Азербайджан", "city": None, "timezone": "+1 к мск", "tz_offset": 1, "languages": None, "note": None},
     ]
 
-    with _lock:
-        conn = _connect()
+    with _session(conn) as conn:
         cur = conn.cursor()
         for p in seed:
             cur.execute("SELECT id FROM profiles WHERE username = ?", (p['username'],))
@@ -151,16 +168,14 @@ def _seed_profiles() -> None:
                         'seed',
                         None,
                         'approved',
-                        datetime.utcnow().isoformat(),
+                        iso_now(),
                     ),
                 )
         conn.commit()
-        conn.close()
 
 
-def add_profile(profile: Dict[str, Any]) -> int:
-    with _lock:
-        conn = _connect()
+def add_profile(profile: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> int:
+    with _session(conn) as conn:
         cur = conn.cursor()
         # allow caller to specify status (e.g. seed -> approved), otherwise default pending
         status = profile.get('status') or ('pending' if profile.get('added_by') != 'seed' else 'approved')
@@ -180,96 +195,132 @@ def add_profile(profile: Dict[str, Any]) -> int:
                 profile.get('added_by', 'user'),
                 added_by_id,
                 status,
-                profile.get('added_at', datetime.utcnow().isoformat()),
+                profile.get('added_at', iso_now()),
             ),
         )
         pid = cur.lastrowid
         conn.commit()
-        conn.close()
         return pid
 
 
-def get_all_profiles(status: Optional[str] = None) -> List[Dict[str, Any]]:
-    with _lock:
-        conn = _connect()
+def get_all_profiles(status: Optional[str] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    with _session(conn) as conn:
         cur = conn.cursor()
         if status:
             cur.execute("SELECT * FROM profiles WHERE status = ? ORDER BY username COLLATE NOCASE", (status,))
         else:
             cur.execute("SELECT * FROM profiles ORDER BY username COLLATE NOCASE")
         rows = [dict(row) for row in cur.fetchall()]
-        conn.close()
         return rows
 
 
-def get_profile_by_username(username: str) -> Optional[Dict[str, Any]]:
-    with _lock:
-        conn = _connect()
+def get_profile_by_username(username: str, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM profiles WHERE username = ?", (username,))
         row = cur.fetchone()
-        conn.close()
         return dict(row) if row else None
 
 
-def get_profile_by_id(pid: int) -> Optional[Dict[str, Any]]:
-    with _lock:
-        conn = _connect()
+def get_profile_by_id(pid: int, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM profiles WHERE id = ?", (pid,))
         row = cur.fetchone()
-        conn.close()
         return dict(row) if row else None
 
 
-def get_profiles_by_status(status: str) -> List[Dict[str, Any]]:
-    return get_all_profiles(status=status)
+# Fields needed to render a profile card (utils.render_cards_bulk)
+CARD_COLUMNS = ('id', 'username', 'name', 'age', 'country', 'city', 'timezone', 'languages', 'note')
 
 
-def update_profile_status_by_id(pid: int, status: str) -> bool:
-    with _lock:
-        conn = _connect()
+def get_profile_columns(status: str, limit: Optional[int] = None, user_added_only: bool = False, conn: Optional[sqlite3.Connection] = None) -> Dict[str, List[Any]]:
+    """Profiles with a given status as columns (field -> list of values), without a dict per row"""
+    query = f"SELECT {', '.join(CARD_COLUMNS)} FROM profiles WHERE status = ?"
+    params: List[Any] = [status]
+    if user_added_only:
+        query += " AND added_by IS NOT NULL AND added_by NOT IN ('', 'seed')"
+    query += " ORDER BY username COLLATE NOCASE"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    with _session(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    if not rows:
+        return {c: [] for c in CARD_COLUMNS}
+    return dict(zip(CARD_COLUMNS, map(list, zip(*rows))))
+
+
+def get_profiles_by_status(status: str, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    return get_all_profiles(status=status, conn=conn)
+
+
+def update_profile_status_by_id(pid: int, status: str, conn: Optional[sqlite3.Connection] = None) -> bool:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("UPDATE profiles SET status = ? WHERE id = ?", (status, pid))
         conn.commit()
         affected = cur.rowcount
-        conn.close()
         return affected > 0
 
 
-def update_profile_status_and_review(pid: int, status: str, reviewed_by_id: int) -> bool:
+def update_profile_status_and_review(pid: int, status: str, reviewed_by_id: int, conn: Optional[sqlite3.Connection] = None) -> bool:
     """Update profile status and mark it as reviewed by admin"""
-    with _lock:
-        conn = _connect()
+    with _session(conn) as conn:
         cur = conn.cursor()
         # Do an atomic conditional update: only apply if the profile hasn't been reviewed yet
         cur.execute(
             "UPDATE profiles SET status = ?, reviewed_by_id = ?, reviewed_at = ? WHERE id = ? AND reviewed_by_id IS NULL",
-            (status, reviewed_by_id, datetime.utcnow().isoformat(), pid)
+            (status, reviewed_by_id, iso_now(), pid)
         )
         conn.commit()
         affected = cur.rowcount
-        conn.close()
         return affected > 0
 
 
-def reject_profile_atomic(pid: int, reviewed_by_id: int) -> bool:
+def reject_profile_atomic(pid: int, reviewed_by_id: int, conn: Optional[sqlite3.Connection] = None) -> bool:
     """Atomically reject profile - only if not yet reviewed by anyone"""
-    with _lock:
-        conn = _connect()
+    with _session(conn) as conn:
         cur = conn.cursor()
         # First mark as rejected with review info (don't delete yet - keep history)
         cur.execute(
             "UPDATE profiles SET status = ?, reviewed_by_id = ?, reviewed_at = ? WHERE id = ? AND reviewed_by_id IS NULL",
-            ('rejected', reviewed_by_id, datetime.utcnow().isoformat(), pid)
+            ('rejected', reviewed_by_id, iso_now(), pid)
         )
         affected = cur.rowcount
         conn.commit()
-        conn.close()
         return affected > 0
 
 
-def update_profile(username: str, changes: Dict[str, Any]) -> bool:
+def apply_reviews(reviews: List[Tuple[int, str, int]], conn: Optional[sqlite3.Connection] = None) -> List[bool]:
+    """Apply a batch of (pid, action, reviewed_by_id) reviews in one transaction.
+
+    Each review uses the same conditional update as update_profile_status_and_review /
+    reject_profile_atomic; rejected profiles are deleted right after being marked.
+    Returns one flag per review: False if the profile was already reviewed.
+    """
+    results = []
+    with _session(conn) as conn:
+        cur = conn.cursor()
+        reviewed_at = iso_now()
+        for pid, action, reviewed_by_id in reviews:
+            status = 'approved' if action == 'accept' else 'rejected'
+            cur.execute(
+                "UPDATE profiles SET status = ?, reviewed_by_id = ?, reviewed_at = ? WHERE id = ? AND reviewed_by_id IS NULL",
+                (status, reviewed_by_id, reviewed_at, pid)
+            )
+            ok = cur.rowcount > 0
+            if ok and action == 'reject':
+                # user can create a new profile after rejection
+                cur.execute("DELETE FROM profiles WHERE id = ?", (pid,))
+            results.append(ok)
+        conn.commit()
+    return results
+
+
+def update_profile(username: str, changes: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> bool:
     keys = []
     values = []
     for k, v in changes.items():
@@ -278,30 +329,25 @@ def update_profile(username: str, changes: Dict[str, Any]) -> bool:
     if not keys:
         return False
     values.append(username)
-    with _lock:
-        conn = _connect()
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute(f"UPDATE profiles SET {', '.join(keys)} WHERE username = ?", values)
         conn.commit()
         affected = cur.rowcount
-        conn.close()
         return affected > 0
 
 
-def delete_profile(username: str) -> bool:
-    with _lock:
-        conn = _connect()
+def delete_profile(username: str, conn: Optional[sqlite3.Connection] = None) -> bool:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM profiles WHERE username = ?", (username,))
         conn.commit()
         affected = cur.rowcount
-        conn.close()
         return affected > 0
 
 
-def add_report(report: Dict[str, Any]) -> int:
-    with _lock:
-        conn = _connect()
+def add_report(report: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> int:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO reports (reporter_id, reporter_username, category, target_identifier, reason, attachments, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
@@ -312,34 +358,55 @@ def add_report(report: Dict[str, Any]) -> int:
                 report.get('target_identifier'),
                 report.get('reason'),
                 report.get('attachments'),
-                report.get('created_at', datetime.utcnow().isoformat()),
+                report.get('created_at', iso_now()),
             ),
         )
         rid = cur.lastrowid
         conn.commit()
-        conn.close()
         return rid
 
 
-def get_reports() -> List[Dict[str, Any]]:
-    with _lock:
-        conn = _connect()
+def add_reports(reports: List[Dict[str, Any]], conn: Optional[sqlite3.Connection] = None) -> int:
+    """Insert several reports with one executemany in a single transaction"""
+    now = iso_now()
+    rows = [
+        (
+            r.get('reporter_id'),
+            r.get('reporter_username'),
+            r.get('category'),
+            r.get('target_identifier'),
+            r.get('reason'),
+            r.get('attachments'),
+            r.get('created_at', now),
+        )
+        for r in reports
+    ]
+    with _session(conn) as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO reports (reporter_id, reporter_username, category, target_identifier, reason, attachments, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        affected = cur.rowcount
+        return affected
+
+
+def get_reports(conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM reports ORDER BY id DESC")
         rows = [dict(row) for row in cur.fetchall()]
-        conn.close()
         return rows
 
 
-def clear_reports() -> bool:
+def clear_reports(conn: Optional[sqlite3.Connection] = None) -> bool:
     """Delete all reports from database"""
-    with _lock:
-        conn = _connect()
+    with _session(conn) as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM reports")
         conn.commit()
         affected = cur.rowcount
-        conn.close()
         return affected > 0
     
 # -----End of db.py-----
\ No newline at end of file
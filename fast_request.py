@@ -0,0 +1,50 @@
+"""
+Telegram HTTP request backend with faster JSON handling.
+Uses orjson for encoding parameters and decoding responses and HTTP/2
+when those are installed, and falls back to PTB's defaults otherwise.
+"""
+from dataclasses import replace
+from typing import Optional
+from telegram.request import HTTPXRequest, RequestData
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP_VERSION = '2'
+except ImportError:  # optional dependency
+    HTTP_VERSION = '1.1'
+
+
+class FastJSONRequest(HTTPXRequest):
+    """HTTPXRequest that serializes and parses JSON with orjson"""
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, **kwargs):
+        if request_data is not None and not request_data.contains_files:
+            # Pre-dump nested values (reply_markup, entities, ...) so PTB's
+            # json_value passes the resulting strings through unchanged
+            request_data = RequestData([
+                replace(p, value=orjson.dumps(p.value).decode())
+                if isinstance(p.value, (dict, list, tuple)) else p
+                for p in request_data._parameters
+            ])
+        return await super().do_request(url, method, request_data, **kwargs)
+
+    @staticmethod
+    def parse_json_payload(payload: bytes):
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # stdlib path decodes with errors="replace" and raises TelegramError
+            return HTTPXRequest.parse_json_payload(payload)
+
+
+def build_request(**kwargs) -> HTTPXRequest:
+    """Return the fastest available request backend"""
+    kwargs.setdefault('http_version', HTTP_VERSION)
+    if orjson is None:
+        return HTTPXRequest(**kwargs)
+    return FastJSONRequest(**kwargs)
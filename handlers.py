@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from telegram import Update, Bot, __version__ as bot_version, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
@@ -13,12 +14,13 @@ from templates.messages import *
 import db
 import utils
 import config
-from utils import iso_now, parse_profile_text, short_profile_card
+from utils import iso_now, short_profile_card, render_cards_bulk
 from typing import Dict, Any
 from functools import lru_cache
 from time import time
 from cache_manager import profile_cache
 from rate_limiter import check_rate_limit, retry_telegram_request
+from batch_writer import review_batcher, reports_writer
 from validators import validate_profile_text, sanitize_text, sanitize_profile_data
 
 logger = logging.getLogger(__name__)
@@ -217,7 +219,7 @@ async def delete_profile_confirm_cb(update: Update, context: ContextTypes.DEFAUL
     ok = db.delete_profile(username)
     if ok:
         # Clear from persistent cache
-        profile_cache.delete(username)
+        await asyncio.to_thread(profile_cache.delete, username)
         # Clear from local cache
         _cache.pop('all_profiles', None)
         _cache.pop('all_approved_profiles', None)
@@ -335,11 +337,6 @@ async def new_profile_receive(update: Update, context: ContextTypes.DEFAULT_TYPE
     return -1
 
 
-async def new_profile_receive_single(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    # This function is no longer needed with simplified flow, but keep it to avoid breaking handlers
-    return -1
-
-
 async def try_auto_profile_submit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Detect free-form profile messages and auto-submit to review.
 
@@ -408,7 +405,7 @@ async def new_profile_confirm_cb(update: Update, context: ContextTypes.DEFAULT_T
     # If profile exists but not approved, delete it first to allow recreation
     if existing_profile and existing_profile.get('status') != 'approved':
         db.delete_profile(username)
-        profile_cache.delete(username)
+        await asyncio.to_thread(profile_cache.delete, username)
         logger.info('new_profile_confirm_cb: deleted old non-approved profile @%s before creating new one', username)
     
     try:
@@ -418,7 +415,7 @@ async def new_profile_confirm_cb(update: Update, context: ContextTypes.DEFAULT_T
         # Cache the new profile for quick access
         profile_with_id = dict(profile)
         profile_with_id['id'] = pid
-        profile_cache.set(pid, profile_with_id)
+        await asyncio.to_thread(profile_cache.set, pid, profile_with_id)
         
         # Send to admins for review
         await q.message.reply_text(
@@ -763,20 +760,17 @@ async def admin_new_profiles_view(update: Update, context: ContextTypes.DEFAULT_
         await q.message.reply_text("Доступ к админ-панели ограничен.")
         return
 
-    # fetch pending user-added profiles
-    added_user_profiles = db.get_profiles_by_status('pending')
-    # filter out any seed items (just in case)
-    added_user_profiles = [p for p in added_user_profiles if p.get('added_by') and p.get('added_by') != 'seed']
-    if not added_user_profiles:
+    # fetch pending user-added profiles (seed items excluded), first 20 as columns
+    pending = await asyncio.to_thread(db.get_profile_columns, 'pending', limit=20, user_added_only=True)
+    if not pending['id']:
         await q.message.reply_text("Новых (пользовательских) анкет пока нет.")
         return
     # send each pending profile as a preview + review buttons
-    for p in added_user_profiles[:20]:
-        card = short_profile_card(p)
+    for pid, card in zip(pending['id'], render_cards_bulk(pending)):
         try:
-            await q.message.reply_text(card, parse_mode='HTML', reply_markup=admin_review_kb(p.get('id')))
+            await q.message.reply_text(card, parse_mode='HTML', reply_markup=admin_review_kb(pid))
         except Exception:
-            logger.exception("Failed to send profile preview to admin for id %s", p.get('id'))
+            logger.exception("Failed to send profile preview to admin for id %s", pid)
 
 
 async def admin_manage_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -795,7 +789,7 @@ async def admin_manage_profiles(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     logger.info('admin_manage_profiles: loaded %d approved profiles', len(all_profiles))
-    usernames = [p['username'] for p in all_profiles]
+    entries = [(p['id'], p['username']) for p in all_profiles]
 
     # Pagination: 12 items per page
     PAGE_SIZE = 12
@@ -810,18 +804,18 @@ async def admin_manage_profiles(update: Update, context: ContextTypes.DEFAULT_TY
             except Exception:
                 page = 0
 
-    total = len(usernames)
+    total = len(entries)
     total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE if total > 0 else 1
     if page >= total_pages:
         page = total_pages - 1
 
     start = page * PAGE_SIZE
     end = start + PAGE_SIZE
-    page_usernames = usernames[start:end]
+    page_entries = entries[start:end]
 
     await q.message.reply_text(
         f"Всего анкет: {total}\n\nВыберите анкету для управления:",
-        reply_markup=admin_manage_profiles_kb_paged(page_usernames, page, total_pages)
+        reply_markup=admin_manage_profiles_kb_paged(page_entries, page, total_pages)
     )
 
 
@@ -841,17 +835,19 @@ async def admin_profile_action(update: Update, context: ContextTypes.DEFAULT_TYP
         await q.message.reply_text("Доступ ограничен.")
         return
     
-    # Parse callback: admin:profile:USERNAME
+    # Parse callback: ap:PROFILE_ID (or legacy admin:profile:USERNAME on old messages)
     parts = q.data.split(':')
-    if len(parts) < 3:
+    if parts[0] == 'ap' and len(parts) == 2 and parts[1].isdigit():
+        profile = await asyncio.to_thread(db.get_profile_by_id, int(parts[1]))
+    elif len(parts) >= 3:
+        profile = await asyncio.to_thread(db.get_profile_by_username, parts[2])
+    else:
         await q.message.reply_text("Ошибка: неверная команда.")
         return
-    username = parts[2]
-    
-    profile = db.get_profile_by_username(username)
     if not profile:
-        await q.message.reply_text(f"Профиль @{username} не найден.")
+        await q.message.reply_text("Профиль не найден.")
         return
+    username = profile['username']
     
     # Show profile info and action buttons
     card = short_profile_card(profile)
@@ -859,26 +855,34 @@ async def admin_profile_action(update: Update, context: ContextTypes.DEFAULT_TYP
                                parse_mode='HTML', reply_markup=admin_profile_action_kb(username))
 
 
-async def admin_edit_profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+### Admin edit profile flow (Conversation)
+
+ADMIN_EDIT_WAIT_TEXT = 12
+
+
+async def admin_edit_profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start editing profile"""
     q = update.callback_query
     await q.answer()
     user = update.effective_user
     if not user or (user.id != config.SUPER_ADMIN_ID and user.id not in config.ADMIN_IDS):
         await q.message.reply_text("Доступ ограничен.")
-        return
-    
+        return -1
+    # re-entry from another profile's button: forget the previous session first
+    context.user_data.pop('admin_edit_username', None)
+    context.user_data.pop('admin_edit_profile', None)
+
     # Parse callback: admin:edit:USERNAME
     parts = q.data.split(':')
     if len(parts) < 3:
         await q.message.reply_text("Ошибка: неверная команда.")
-        return
+        return -1
     username = parts[2]
     
-    profile = db.get_profile_by_username(username)
+    profile = await asyncio.to_thread(db.get_profile_by_username, username)
     if not profile:
         await q.message.reply_text(f"Профиль @{username} не найден.")
-        return
+        return -1
     
     # Store profile info in context for editing
     context.user_data['admin_edit_username'] = username
@@ -916,18 +920,19 @@ async def admin_edit_profile_start(update: Update, context: ContextTypes.DEFAULT
     )
     cancel_kb = InlineKeyboardMarkup([[InlineKeyboardButton(text="❌ Отмена редактирования", callback_data="admin:edit:cancel")]])
     await q.message.reply_text(edit_info, parse_mode='HTML', reply_markup=cancel_kb)
+    return ADMIN_EDIT_WAIT_TEXT
 
 
-async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Receive edited profile data from admin - supports both structured and free text"""
     username = context.user_data.get('admin_edit_username')
     if not username:
-        return
+        return -1
     
     user = update.effective_user
     if not user or (user.id != config.SUPER_ADMIN_ID and user.id not in config.ADMIN_IDS):
         await update.message.reply_text("Доступ ограничен.")
-        return
+        return -1
     
     text = update.message.text or ''
     
@@ -936,11 +941,11 @@ async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAU
         context.user_data.pop('admin_edit_username', None)
         context.user_data.pop('admin_edit_profile', None)
         await update.message.reply_text("❌ Редактирование отменено.", reply_markup=main_menu())
-        return
+        return -1
     
     if not text or text.strip() == '':
         await update.message.reply_text("Ошибка: отправьте текст.")
-        return
+        return ADMIN_EDIT_WAIT_TEXT
     
     try:
         changes = {}
@@ -967,7 +972,7 @@ async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAU
                         changes['age'] = int(value)
                     except ValueError:
                         await update.message.reply_text(f"❌ Ошибка: возраст должен быть числом.\n\nПример: age:30")
-                        return
+                        return -1
                 elif key == 'name':
                     changes['name'] = value
                 elif key == 'country':
@@ -987,13 +992,13 @@ async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAU
         
         if not changes:
             await update.message.reply_text("❌ Ошибка: не найдены изменения.")
-            return
+            return -1
         
         # Update profile
-        ok = db.update_profile(username, changes)
+        ok = await asyncio.to_thread(db.update_profile, username, changes)
         if ok:
             # Update cache
-            profile_cache.update(username, changes)
+            await asyncio.to_thread(profile_cache.update, username, changes)
             
             changed_fields = ', '.join(changes.keys())
             await update.message.reply_text(
@@ -1009,6 +1014,36 @@ async def admin_receive_profile_edit(update: Update, context: ContextTypes.DEFAU
     finally:
         context.user_data.pop('admin_edit_username', None)
         context.user_data.pop('admin_edit_profile', None)
+    return -1
+
+
+async def admin_edit_profile_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancel admin profile editing via inline button"""
+    q = update.callback_query
+    await q.answer()
+    context.user_data.pop('admin_edit_username', None)
+    context.user_data.pop('admin_edit_profile', None)
+    await q.message.reply_text("❌ Редактирование отменено.")
+    return -1
+
+
+async def admin_edit_profile_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop the admin edit session when the conversation times out"""
+    context.user_data.pop('admin_edit_username', None)
+    context.user_data.pop('admin_edit_profile', None)
+
+
+async def admin_edit_profile_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Main menu button pressed mid-edit: end the session instead of saving the
+    button text, then serve the button (flows with their own conversation need
+    a second press)"""
+    context.user_data.pop('admin_edit_username', None)
+    context.user_data.pop('admin_edit_profile', None)
+    await update.message.reply_text("❌ Редактирование отменено.")
+    menu_handler = MENU_BUTTONS.get(update.message.text)
+    if menu_handler:
+        await menu_handler(update, context)
+    return -1
 
 
 async def admin_delete_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1027,7 +1062,7 @@ async def admin_delete_profile(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     username = parts[2]
     
-    profile = db.get_profile_by_username(username)
+    profile = await asyncio.to_thread(db.get_profile_by_username, username)
     if not profile:
         await q.message.reply_text(f"Профиль @{username} не найден.")
         return
@@ -1037,29 +1072,15 @@ async def admin_delete_profile(update: Update, context: ContextTypes.DEFAULT_TYP
                                reply_markup=confirm_delete_kb(username))
 
 
-### Hook for edited profile text (admin simple update)
-
-async def admin_receive_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    username = context.user_data.get('edit_username')
-    # only handle if edit session active and user is admin
-    if not username:
+async def _notify_submitter(context: ContextTypes.DEFAULT_TYPE, profile: Dict[str, Any], text: str) -> None:
+    """Tell the profile author about a review decision if we know their user id"""
+    aid = profile.get('added_by_id')
+    if not aid:
         return
-    if update.effective_user.id not in config.ADMIN_IDS:
-        # ignore silently for non-admins
-        return
-    text = update.message.text or ''
-    parsed = parse_profile_text(text)
-    data = parsed['data']
-    changes = {}
-    for k in ('age', 'name', 'country', 'city', 'timezone', 'tz_offset', 'languages', 'note'):
-        if k in data and data.get(k) is not None:
-            changes[k] = data.get(k)
-    ok = db.update_profile(username, changes)
-    if ok:
-        await update.message.reply_text('Профиль обновлён.')
-    else:
-        await update.message.reply_text('Ошибка обновления.')
-    context.user_data.pop('edit_username', None)
+    try:
+        await retry_telegram_request(context.bot.send_message, chat_id=aid, text=text)
+    except Exception:
+        logger.exception('Failed to notify submitter about review for %s', profile.get('id'))
 
 
 async def admin_review_cb(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1081,71 +1102,56 @@ async def admin_review_cb(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await q.message.reply_text('Неправильный ID.')
         return
     action = parts[2]
-    profile = db.get_profile_by_id(pid)
+    profile = await asyncio.to_thread(db.get_profile_by_id, pid)
     if not profile:
         await q.message.reply_text('Анкета не найдена.')
         return
 
     if action == 'accept':
         # Atomically attempt to set reviewed_by_id and status
-        # This will only succeed if reviewed_by_id is NULL (not yet reviewed)
-        ok = db.update_profile_status_and_review(pid, 'approved', user.id)
+        # This will only succeed if reviewed_by_id is NULL (not yet reviewed);
+        # rapid reviews are committed together by the batcher
+        ok = await review_batcher.submit(pid, 'accept', user.id)
         if ok:
             # Update cache
-            profile_cache.update(pid, {'status': 'approved', 'reviewed_by_id': user.id})
+            await asyncio.to_thread(profile_cache.update, pid, {'status': 'approved', 'reviewed_by_id': user.id})
             # Clear local cache lists
             _cache.pop('all_profiles', None)
             _cache.pop('all_approved_profiles', None)
             
-            await q.message.reply_text(f'✅ Анкета @{profile.get("username")} принята.')
-            # notify submitter if we know their user id
-            try:
-                aid = profile.get('added_by_id')
-                if aid:
-                    await retry_telegram_request(
-                        context.bot.send_message,
-                        chat_id=aid,
-                        text=f'✅ Ваша анкета @{profile.get("username")} принята администратором! Теперь вы в списке.'
-                    )
-            except Exception:
-                logger.exception('Failed to notify submitter about acceptance for %s', pid)
+            await asyncio.gather(
+                q.message.reply_text(f'✅ Анкета @{profile.get("username")} принята.'),
+                _notify_submitter(context, profile, f'✅ Ваша анкета @{profile.get("username")} принята администратором! Теперь вы в списке.'),
+            )
         else:
             # Атомарное обновление не сработало = анкета уже была проверена другим админом
             await q.message.reply_text('❌ Эта анкета уже была проверена другим администратором. Повторное решение невозможно.\n\nПользователь должен отправить новую анкету для повторной проверки.')
     elif action == 'reject':
         username = profile.get('username')
-        # Atomically mark as rejected (only if not yet reviewed)
-        ok = db.reject_profile_atomic(pid, user.id)
+        # Atomically mark as rejected (only if not yet reviewed), then delete -
+        # user can create new one
+        ok = await review_batcher.submit(pid, 'reject', user.id)
         if ok:
-            # Then delete the profile - user can create new one
-            db.delete_profile(username)
             # Clear from persistent cache
-            profile_cache.delete(username)
+            await asyncio.to_thread(profile_cache.delete, username)
             # Clear from local cache lists
             _cache.pop('all_profiles', None)
             _cache.pop('all_approved_profiles', None)
             
-            await q.message.reply_text(f'❌ Анкета @{username} отклонена и удалена.')
-            try:
-                aid = profile.get('added_by_id')
-                if aid:
-                    await retry_telegram_request(
-                        context.bot.send_message,
-                        chat_id=aid,
-                        text=f'❌ Ваша анкета @{username} отклонена администратором. Вы можете создать новую.'
-                    )
-            except Exception:
-                logger.exception('Failed to notify submitter about rejection for %s', pid)
+            await asyncio.gather(
+                q.message.reply_text(f'❌ Анкета @{username} отклонена и удалена.'),
+                _notify_submitter(context, profile, f'❌ Ваша анкета @{username} отклонена администратором. Вы можете создать новую.'),
+            )
             logger.info('admin_review_cb: admin %s rejected and deleted profile @%s (id=%s)', user.id, username, pid)
         else:
             # Атомарное обновление не сработало = анкета уже была проверена другим админом
             await q.message.reply_text('❌ Эта анкета уже была проверена другим администратором. Повторное решение невозможно.\n\nПользователь должен отправить новую анкету для повторной проверки.')
     elif action == 'delete':
         username = profile.get('username')
-        ok = db.delete_profile(username)
+        ok = await asyncio.to_thread(db.delete_profile, username)
         if ok:
             # Clear from persistent cache by username
-            profile_cache.delete(username)
+            await asyncio.to_thread(profile_cache.delete, username)
             # Clear from local cache
             _cache.pop('all_profiles', None)
             _cache.pop('all_approved_profiles', None)
@@ -1204,7 +1210,7 @@ async def afk_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return -1
     
     # Check if user has a profile
-    profile = db.get_profile_by_username(user.username)
+    profile = await asyncio.to_thread(db.get_profile_by_username, user.username)
     if not profile:
         await update.message.reply_text("❌ Вы можете подать заявку на AFK только если у вас есть анкета.\n\nСначала создайте анкету в разделе 'Анкета'.")
         return -1
@@ -1259,7 +1265,7 @@ async def afk_receive_reason(update: Update, context: ContextTypes.DEFAULT_TYPE)
         'attachments': None,
         'created_at': iso_now(),
     }
-    db.add_report(r)
+    await reports_writer.submit(r)
     
     await update.message.reply_text(AFK_SUBMITTED, reply_markup=None)
     
@@ -1285,6 +1291,24 @@ async def afk_receive_reason(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return -1
 
 
+def _format_request_rows(rows, marker: str) -> str:
+    """Render AFK/admin-application rows separated by ━━━ in a single join"""
+    parts = []
+    append = parts.append
+    for r in rows:
+        append(marker)
+        append(" @")
+        append(r['reporter_username'] or '')
+        append(" (")
+        append(str(r['reporter_id']))
+        append(")\n⏰ ")
+        append(r['created_at'] or '')
+        append("\n📝 ")
+        append((r['reason'] or '')[:200])
+        append("\n━━━\n")
+    return ''.join(parts[:-1])
+
+
 async def admin_afk_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show AFK requests from admin panel"""
     q = update.callback_query
@@ -1295,7 +1319,7 @@ async def admin_afk_requests(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     # Get all AFK requests (stored as reports with category 'afk_request')
-    reports = db.get_reports()
+    reports = await asyncio.to_thread(db.get_reports)
     afk_requests = [r for r in reports if r.get('category') == 'afk_request']
     
     if not afk_requests:
@@ -1303,11 +1327,7 @@ async def admin_afk_requests(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     # Show last 10 AFK requests with details
-    lines = []
-    for r in afk_requests[-10:]:
-        reason_text = r.get('reason', '')
-        lines.append(f"📍 @{r.get('reporter_username')} ({r.get('reporter_id')})\n⏰ {r.get('created_at')}\n📝 {reason_text[:200]}")
-    text = f"🌙 AFK заявки (всего: {len(afk_requests)}):\n\n" + "\n━━━\n".join(lines)
+    text = f"🌙 AFK заявки (всего: {len(afk_requests)}):\n\n" + _format_request_rows(afk_requests[-10:], "📍")
     
     from telegram import InlineKeyboardMarkup, InlineKeyboardButton
     kb = InlineKeyboardMarkup([
@@ -1326,7 +1346,7 @@ async def admin_admin_applications(update: Update, context: ContextTypes.DEFAULT
         return
     
     # Get all admin applications (stored as reports with category 'admin_application')
-    reports = db.get_reports()
+    reports = await asyncio.to_thread(db.get_reports)
     admin_apps = [r for r in reports if r.get('category') == 'admin_application']
     
     if not admin_apps:
@@ -1334,11 +1354,7 @@ async def admin_admin_applications(update: Update, context: ContextTypes.DEFAULT
         return
     
     # Show last 10 admin applications with details
-    lines = []
-    for r in admin_apps[-10:]:
-        app_text = r.get('reason', '')
-        lines.append(f"👤 @{r.get('reporter_username')} ({r.get('reporter_id')})\n⏰ {r.get('created_at')}\n📝 {app_text[:200]}")
-    text = f"📋 Заявки на админа (всего: {len(admin_apps)}):\n\n" + "\n━━━\n".join(lines)
+    text = f"📋 Заявки на админа (всего: {len(admin_apps)}):\n\n" + _format_request_rows(admin_apps[-10:], "👤")
     
     from telegram import InlineKeyboardMarkup, InlineKeyboardButton
     kb = InlineKeyboardMarkup([
@@ -1360,7 +1376,7 @@ async def admin_app_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return -1
     
     # Check if user has a profile
-    profile = db.get_profile_by_username(user.username)
+    profile = await asyncio.to_thread(db.get_profile_by_username, user.username)
     if not profile:
         await update.message.reply_text("❌ Вы можете подать заявку на админа только если у вас есть анкета.\n\nСначала создайте анкету в разделе 'Анкета'.")
         return -1
@@ -1394,7 +1410,7 @@ async def admin_app_receive(update: Update, context: ContextTypes.DEFAULT_TYPE)
         'attachments': None,
         'created_at': iso_now(),
     }
-    db.add_report(r)
+    await reports_writer.submit(r)
     
     await update.message.reply_text(ADMIN_APP_SUBMITTED, reply_markup=None)
     
@@ -1530,7 +1546,7 @@ async def admin_add_profile_receive_note(update: Update, context: ContextTypes.D
         pid = db.add_profile(profile)
         profile_with_id = dict(profile)
         profile_with_id['id'] = pid
-        profile_cache.set(pid, profile_with_id)
+        await asyncio.to_thread(profile_cache.set, pid, profile_with_id)
         
         logger.info('admin_add_profile_receive_note: admin=%s added profile @%s', user.id, username)
         
@@ -1562,3 +1578,14 @@ async def admin_app_cancel_inline(update: Update, context: ContextTypes.DEFAULT_
     await q.answer()
     await q.message.reply_text("❌ Заявка на админа отменена.")
     return -1
+
+
+# Main menu buttons served by a plain handler (the rest start conversations)
+MENU_BUTTONS = {
+    'Информация о пользователях': users_list_entry,
+    'Информация о чате': chat_info_cmd,
+    'Правила': rules_entry,
+    'Админы': admins_list_entry,
+    'Анкета': profile_menu_entry,
+    'Админ панель': admin_panel_entry,
+}
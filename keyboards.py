@@ -1,23 +1,90 @@
 from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
-from typing import Iterable
+from typing import Iterable, Tuple
+from functools import lru_cache
+from sys import intern
+
+
+# Static keyboards are built once at import: markups are immutable, so the
+# same object can be sent any number of times.
+_MAIN_MENU_ROWS = (
+    ("Информация о пользователях",),
+    ("Анкета",),
+    ("Репорт",),
+    ("AFK",),
+    ("Заявка на админа",),
+    ("Правила", "Информация о чате"),
+    ("Админы",),
+    ("Админ панель",),
+)
+_MAIN_MENU = ReplyKeyboardMarkup(_MAIN_MENU_ROWS, resize_keyboard=True)
+
+# Every reply-keyboard button text (for filters that must not treat them as input)
+MAIN_MENU_BUTTONS = tuple(text for row in _MAIN_MENU_ROWS for text in row)
+
+_REPORT_CATS = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="TG-бот", callback_data="report:bot")],
+    [InlineKeyboardButton(text="TG-канал/группа", callback_data="report:channel")],
+    [InlineKeyboardButton(text="Чат", callback_data="report:chat")],
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="report:cancel")],
+])
+
+_NEW_PROFILE_PREVIEW = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="Подтвердить", callback_data="new:confirm")],
+    [InlineKeyboardButton(text="Редактировать", callback_data="new:edit")],
+    [InlineKeyboardButton(text="Отмена", callback_data="new:cancel")],
+])
+
+_PROFILE_MENU_HAS = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="Редактировать", callback_data="profile:edit_start")],
+    [InlineKeyboardButton(text="Назад", callback_data="back:menu")],
+])
+
+_PROFILE_MENU_NO = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="Новая анкета", callback_data="profile:new_start")],
+    [InlineKeyboardButton(text="Назад", callback_data="back:menu")],
+])
+
+_EDIT_PROFILE_PREVIEW = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="Подтвердить", callback_data="edit:confirm")],
+    [InlineKeyboardButton(text="Отмена", callback_data="edit:cancel")],
+])
+
+_AFK_DAYS = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="1 день", callback_data="afk:days:1"),
+     InlineKeyboardButton(text="3 дня", callback_data="afk:days:3")],
+    [InlineKeyboardButton(text="7 дней", callback_data="afk:days:7"),
+     InlineKeyboardButton(text="14 дней", callback_data="afk:days:14")],
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="afk:cancel")],
+])
+
+_AFK_REASON = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="afk:cancel")],
+])
+
+_ADMIN_APP_REASON = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_app:cancel")],
+])
+
+_ADMIN_ADD_PROFILE_CANCEL = InlineKeyboardMarkup([
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_add_profile:cancel")],
+])
+
+# Shared by every paged profile list render
+_CLOSE_ROW = (InlineKeyboardButton(text="Закрыть", callback_data="back:menu"),)
 
 
 def main_menu() -> ReplyKeyboardMarkup:
-    keyboard = [
-        ["Информация о пользователях"],
-        ["Анкета"],
-        ["Репорт"],
-        ["AFK"],
-        ["Заявка на админа"],
-        ["Правила", "Информация о чате"],
-        ["Админы"],
-        ["Админ панель"],
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return _MAIN_MENU
 
 
 def users_list_kb(usernames: Iterable[str]) -> InlineKeyboardMarkup:
-    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=f"view:{u}")] for u in usernames]
+    return _users_list_kb_cached(tuple(usernames))
+
+
+@lru_cache(maxsize=256)
+def _users_list_kb_cached(usernames: tuple) -> InlineKeyboardMarkup:
+    # interned so the same callback string is shared by every cached list it appears in
+    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=intern(f"view:{u}"))] for u in usernames]
     buttons.append([
         InlineKeyboardButton(text="Добавить новую", callback_data="back:add_new"),
         InlineKeyboardButton(text="Назад", callback_data="back:menu"),
@@ -26,17 +93,21 @@ def users_list_kb(usernames: Iterable[str]) -> InlineKeyboardMarkup:
 
 
 def profile_actions_kb(username: str, is_admin: bool = False, user_id: int = None, profile_owner_id: int = None) -> InlineKeyboardMarkup:
-    buttons = [[InlineKeyboardButton(text="Назад", callback_data="back:users")]]
-    
     can_edit = is_admin or (user_id and profile_owner_id and user_id == profile_owner_id)
+    return _profile_actions_kb_cached(username, bool(can_edit), bool(is_admin))
+
+
+@lru_cache(maxsize=256)
+def _profile_actions_kb_cached(username: str, can_edit: bool, is_admin: bool) -> InlineKeyboardMarkup:
+    buttons = [[InlineKeyboardButton(text="Назад", callback_data="back:users")]]
     if can_edit:
         buttons[0].append(InlineKeyboardButton(text="Редактировать", callback_data=f"edit:{username}"))
-    
     if is_admin:
         buttons[0].append(InlineKeyboardButton(text="Удалить", callback_data=f"delete:{username}"))
     return InlineKeyboardMarkup(buttons)
 
 
+@lru_cache(maxsize=512)
 def confirm_delete_kb(username: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(text="Подтвердить удаление", callback_data=f"delete_confirm:{username}")],
@@ -45,43 +116,23 @@ def confirm_delete_kb(username: str) -> InlineKeyboardMarkup:
 
 
 def report_categories_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="TG-бот", callback_data="report:bot")],
-        [InlineKeyboardButton(text="TG-канал/группа", callback_data="report:channel")],
-        [InlineKeyboardButton(text="Чат", callback_data="report:chat")],
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="report:cancel")],
-    ])
+    return _REPORT_CATS
 
 
 def new_profile_preview_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="Подтвердить", callback_data="new:confirm")],
-        [InlineKeyboardButton(text="Редактировать", callback_data="new:edit")],
-        [InlineKeyboardButton(text="Отмена", callback_data="new:cancel")],
-    ])
+    return _NEW_PROFILE_PREVIEW
 
 
 def profile_menu_kb(has_profile: bool) -> InlineKeyboardMarkup:
     """Menu to create new profile or edit existing one"""
-    if has_profile:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton(text="Редактировать", callback_data="profile:edit_start")],
-            [InlineKeyboardButton(text="Назад", callback_data="back:menu")],
-        ])
-    else:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton(text="Новая анкета", callback_data="profile:new_start")],
-            [InlineKeyboardButton(text="Назад", callback_data="back:menu")],
-        ])
+    return _PROFILE_MENU_HAS if has_profile else _PROFILE_MENU_NO
 
 
 def edit_profile_preview_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="Подтвердить", callback_data="edit:confirm")],
-        [InlineKeyboardButton(text="Отмена", callback_data="edit:cancel")],
-    ])
+    return _EDIT_PROFILE_PREVIEW
 
 
+@lru_cache(maxsize=512)
 def admin_review_kb(profile_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(text="Принять", callback_data=f"review:{profile_id}:accept")],
@@ -89,30 +140,43 @@ def admin_review_kb(profile_id: int) -> InlineKeyboardMarkup:
     ])
 
 
-def admin_manage_profiles_kb(usernames: Iterable[str]) -> InlineKeyboardMarkup:
-    """List of profiles for admin to manage"""
-    # usernames here are only the page slice
-    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=f"admin:profile:{u}")] for u in usernames]
+def admin_manage_profiles_kb(profiles: Iterable[Tuple[int, str]]) -> InlineKeyboardMarkup:
+    """List of profiles for admin to manage, given as (profile_id, username) pairs"""
+    return _admin_manage_profiles_kb_cached(tuple(profiles))
+
+
+@lru_cache(maxsize=256)
+def _admin_manage_profiles_kb_cached(profiles: tuple) -> InlineKeyboardMarkup:
+    # profiles here are only the page slice; buttons carry the short int id
+    # (ap:<id>) so callback_data stays well under Telegram's 64-byte limit
+    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=f"ap:{pid}")] for pid, u in profiles]
     # default back to admin panel
     buttons.append([InlineKeyboardButton(text="Назад", callback_data="back:menu")])
     return InlineKeyboardMarkup(buttons)
 
 
-def admin_manage_profiles_kb_paged(usernames: Iterable[str], page: int, total_pages: int) -> InlineKeyboardMarkup:
-    """Paged list of profiles with navigation buttons"""
-    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=f"admin:profile:{u}")] for u in usernames]
-    nav = []
-    if page > 0:
-        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"admin:manage_profiles:page:{page-1}"))
-    nav.append(InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="admin:manage_profiles:page:info"))
-    if page < total_pages - 1:
-        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"admin:manage_profiles:page:{page+1}"))
+def admin_manage_profiles_kb_paged(profiles: Iterable[Tuple[int, str]], page: int, total_pages: int) -> InlineKeyboardMarkup:
+    """Paged list of profiles, given as (profile_id, username) pairs, with navigation buttons"""
+    return _admin_manage_profiles_kb_paged_cached(tuple(profiles), page, total_pages)
+
+
+@lru_cache(maxsize=256)
+def _admin_manage_profiles_kb_paged_cached(profiles: tuple, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    buttons = [[InlineKeyboardButton(text=f"@{u}", callback_data=intern(f"ap:{pid}"))] for pid, u in profiles]
+    nav = [
+        b for b in (
+            InlineKeyboardButton(text="⬅️", callback_data=f"admin:manage_profiles:page:{page-1}") if page > 0 else None,
+            InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="admin:manage_profiles:page:info"),
+            InlineKeyboardButton(text="➡️", callback_data=f"admin:manage_profiles:page:{page+1}") if page < total_pages - 1 else None,
+        ) if b is not None
+    ]
     buttons.append(nav)
     # Back to admin panel
-    buttons.append([InlineKeyboardButton(text="Закрыть", callback_data="back:menu")])
+    buttons.append(_CLOSE_ROW)
     return InlineKeyboardMarkup(buttons)
 
 
+@lru_cache(maxsize=512)
 def admin_profile_action_kb(username: str) -> InlineKeyboardMarkup:
     """Action buttons for profile management"""
     return InlineKeyboardMarkup([
@@ -124,31 +188,19 @@ def admin_profile_action_kb(username: str) -> InlineKeyboardMarkup:
 
 def afk_days_kb() -> InlineKeyboardMarkup:
     """Inline keyboard for selecting AFK days"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="1 день", callback_data="afk:days:1"),
-         InlineKeyboardButton(text="3 дня", callback_data="afk:days:3")],
-        [InlineKeyboardButton(text="7 дней", callback_data="afk:days:7"),
-         InlineKeyboardButton(text="14 дней", callback_data="afk:days:14")],
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="afk:cancel")],
-    ])
+    return _AFK_DAYS
 
 
 def afk_reason_kb() -> InlineKeyboardMarkup:
     """Inline keyboard for AFK reason input - only cancel button"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="afk:cancel")],
-    ])
+    return _AFK_REASON
 
 
 def admin_app_reason_kb() -> InlineKeyboardMarkup:
     """Inline keyboard for admin application with cancel button"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_app:cancel")],
-    ])
+    return _ADMIN_APP_REASON
 
 
 def admin_add_profile_cancel_kb() -> InlineKeyboardMarkup:
     """Inline keyboard for admin adding profile with cancel button"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_add_profile:cancel")],
-    ])
+    return _ADMIN_ADD_PROFILE_CANCEL
@@ -1,64 +1,141 @@
+import asyncio
+import atexit
 import logging
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
 import config
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters, Application, ContextTypes
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, TypeHandler, filters, Application, ContextTypes
 from telegram.error import TelegramError
 import handlers
 import db
 from cache_manager import profile_cache
 from rate_limiter import retry_telegram_request
+from batch_writer import review_batcher, reports_writer
+from fast_request import build_request
+from keyboards import MAIN_MENU_BUTTONS
+from update_processor import PerChatUpdateProcessor
 import sys
 
 
-# Configure logging with both file and console output
-logging.basicConfig(
-    level=logging.DEBUG,  # Capture all levels
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    handlers=[
-        # Console output - only INFO and above in production
-        logging.StreamHandler(sys.stdout),
-        # File output - all levels
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
+# Configure logging with both file and console output. The real handlers
+# run on a QueueListener thread so log calls never block the event loop
+# on console or file I/O.
+_log_format = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+# Console output - only INFO and above in production
+_console_handler = logging.StreamHandler(sys.stdout)
+# File output - all levels
+_file_handler = logging.FileHandler('bot.log', encoding='utf-8')
+for _h in (_console_handler, _file_handler):
+    _h.setFormatter(_log_format)
 
-# Set appropriate levels for specific loggers
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _console_handler, _file_handler, respect_handler_level=True)
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)  # DEBUG is opt-in per logger (see LOG_LEVEL below)
+_root_logger.addHandler(QueueHandler(_log_queue))
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Handler patterns compiled once and shared across conversations
+CANCEL_RE = re.compile(r'^(отмена|cancel)$', re.IGNORECASE)
+REPORT_RE = re.compile(r'\b(репорт\w*|жалоб\w*)', re.IGNORECASE)
+MAIN_MENU_TEXT = filters.Text(MAIN_MENU_BUTTONS)
+
+# Set appropriate levels for specific loggers; library loggers inherit INFO from root
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, config.LOG_LEVEL))
 
-# Reduce noise from telegram library
-logging.getLogger('telegram.ext._application').setLevel(logging.WARNING)
-logging.getLogger('telegram.ext._dispatcher').setLevel(logging.WARNING)
-logging.getLogger('telegram').setLevel(logging.WARNING)
-
 
 async def handle_error(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Global error handler for the bot"""
-    logger.error(f'Error: {context.error}', exc_info=context.error)
+    logger.error('Error: %s', context.error, exc_info=context.error)
     
-    # Notify user about error
+    # Notify the user and the super admin concurrently
+    sends = []
+    labels = []
     if update and update.effective_chat:
-        try:
-            error_msg = '❌ Произошла непредвиденная ошибка. Пожалуйста, попробуйте позже или обратитесь к администратору.'
-            await retry_telegram_request(
-                context.bot.send_message,
-                chat_id=update.effective_chat.id,
-                text=error_msg
-            )
-        except Exception as e:
-            logger.error(f'Failed to send error message: {e}')
+        error_msg = '❌ Произошла непредвиденная ошибка. Пожалуйста, попробуйте позже или обратитесь к администратору.'
+        sends.append(retry_telegram_request(
+            context.bot.send_message,
+            chat_id=update.effective_chat.id,
+            text=error_msg
+        ))
+        labels.append('send error message')
     
     # Notify super admin about critical errors
     if config.SUPER_ADMIN_ID and isinstance(context.error, (TelegramError, Exception)):
-        try:
-            error_msg = f'🚨 Bot Error:\n\n{type(context.error).__name__}: {context.error}'
-            await retry_telegram_request(
-                context.bot.send_message,
-                chat_id=config.SUPER_ADMIN_ID,
-                text=error_msg[:4000]  # Telegram message limit
-            )
-        except Exception as e:
-            logger.error(f'Failed to notify admin about error: {e}')
+        admin_msg = f'🚨 Bot Error:\n\n{type(context.error).__name__}: {context.error}'
+        sends.append(retry_telegram_request(
+            context.bot.send_message,
+            chat_id=config.SUPER_ADMIN_ID,
+            text=admin_msg[:4000]  # Telegram message limit
+        ))
+        labels.append('notify admin about error')
+    
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    for label, result in zip(labels, results):
+        if isinstance(result, Exception):
+            logger.error('Failed to %s: %s', label, result)
+
+
+async def _answer_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Acknowledge a callback that has nothing to do (e.g. page counter button)"""
+    await update.callback_query.answer()
+
+
+# callback_data -> handler. Lookup order in cb_router: full data,
+# then first two ':'-separated parts, then the first part alone.
+CALLBACK_ROUTES = {
+    'view': handlers.view_profile_cb,
+    'back': handlers.back_to_users,
+    'delete': handlers.delete_profile_cb,
+    'delete_confirm': handlers.delete_profile_confirm_cb,
+    'profile:new_start': handlers.profile_new_start_cb,
+    # profile edit from profile view (user clicks 'Редактировать' next to profile)
+    'edit': handlers.edit_profile_cb,
+    'edit:confirm': handlers.edit_profile_confirm_cb,
+    'edit:cancel': handlers.edit_profile_cancel_cb,
+    'admin:reports': handlers.admin_reports_view,
+    'admin:clear_reports': handlers.admin_clear_reports,
+    'admin:new_profiles': handlers.admin_new_profiles_view,
+    # also handles pagination callbacks like admin:manage_profiles:page:N
+    'admin:manage_profiles': handlers.admin_manage_profiles,
+    'admin:manage_profiles:page:info': _answer_callback,
+    'ap': handlers.admin_profile_action,
+    # buttons sent before the switch to ap:<id> still carry admin:profile:<username>
+    'admin:profile': handlers.admin_profile_action,
+    'admin:delete': handlers.admin_delete_profile,
+    'admin:afk_requests': handlers.admin_afk_requests,
+    'admin:admin_applications': handlers.admin_admin_applications,
+    # review callbacks (accept/reject)
+    'review': handlers.admin_review_cb,
+    # choosing category in report flow
+    'report': handlers.report_select_cb,
+    'new:confirm': handlers.new_profile_confirm_cb,
+    'new:cancel': handlers.new_profile_cancel_cb,
+}
+
+
+async def cb_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Dispatch a callback query with dict lookups instead of a regex per handler"""
+    data = update.callback_query.data or ''
+    parts = data.split(':', 2)
+    fn = (
+        CALLBACK_ROUTES.get(data)
+        or CALLBACK_ROUTES.get(':'.join(parts[:2]))
+        or CALLBACK_ROUTES.get(parts[0])
+        or _answer_callback
+    )
+    return await fn(update, context)
+
+
+async def on_shutdown(app: Application) -> None:
+    """Flush batched database writes and the profile cache before the bot exits"""
+    await review_batcher.close()
+    await reports_writer.close()
+    await asyncio.to_thread(profile_cache.close)
 
 
 def main():
@@ -81,9 +158,15 @@ def main():
         app = (
             ApplicationBuilder()
             .token(token)
-            .read_timeout(20)
-            .write_timeout(20)
-            .connect_timeout(15)
+            # timeouts live on the request object when one is passed explicitly;
+            # PTB's default pool is a single connection, too small for concurrent updates
+            .request(build_request(connection_pool_size=32, read_timeout=20, write_timeout=20, connect_timeout=15))
+            # long polling gets its own pool so it never holds up API calls
+            .get_updates_request(build_request(connection_pool_size=4))
+            # up to 256 updates in parallel across chats; one chat/user's updates
+            # stay in order so conversation states are never read stale
+            .concurrent_updates(PerChatUpdateProcessor(256))
+            .post_shutdown(on_shutdown)
             .build()
         )
 
@@ -93,7 +176,7 @@ def main():
         db.init_db()
         
         logger.info(f'✅ Database initialized')
-        logger.info(f'💾 Cached profiles loaded: {len(profile_cache.cache)} profiles')
+        logger.info(f'💾 Cached profiles loaded: {len(profile_cache)} profiles')
         logger.info(f'👥 Admin IDs: {config.ADMIN_IDS}')
         logger.info(f'👑 Super admin ID: {config.SUPER_ADMIN_ID}')
 
@@ -104,7 +187,7 @@ def main():
         new_conv = ConversationHandler(
             entry_points=[CallbackQueryHandler(handlers.profile_new_start_cb, pattern=r'^profile:new_start$')],
             states={
-                handlers.NP_WAIT_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.new_profile_receive), MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.new_profile_receive_single)],
+                handlers.NP_WAIT_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.new_profile_receive)],
             },
             fallbacks=[],
         )
@@ -113,8 +196,7 @@ def main():
         # Report conversation (handles /report flow: category selection → reason input)
         report_conv = ConversationHandler(
             entry_points=[
-                MessageHandler(filters.Regex('^Репорт$'), handlers.report_start),
-                MessageHandler(filters.Regex(r'(?i)\b(репорт\w*|жалоб\w*)'), handlers.report_start),
+                MessageHandler(filters.Regex(REPORT_RE), handlers.report_start),
             ],
             states={
                 handlers.RP_WAIT_REASON: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.report_reason_received)],
@@ -137,7 +219,7 @@ def main():
                 ],
             },
             fallbacks=[
-                MessageHandler(filters.Regex('^Отмена$|^отмена$|^Cancel$|^cancel$'), handlers.afk_cancel),
+                MessageHandler(filters.Regex(CANCEL_RE), handlers.afk_cancel),
                 CallbackQueryHandler(handlers.afk_cancel_inline, pattern=r'^afk:cancel$'),
             ],
         )
@@ -150,7 +232,7 @@ def main():
                 handlers.AA_WAIT_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.admin_app_receive)],
             },
             fallbacks=[
-                MessageHandler(filters.Regex('^Отмена$|^отмена$|^Cancel$|^cancel$'), handlers.admin_app_cancel),
+                MessageHandler(filters.Regex(CANCEL_RE), handlers.admin_app_cancel),
                 CallbackQueryHandler(handlers.admin_app_cancel_inline, pattern=r'^admin_app:cancel$'),
             ],
         )
@@ -179,6 +261,25 @@ def main():
         )
         app.add_handler(edit_conv)
 
+        # Admin edit profile conversation (routes text only while an edit session is live).
+        # Re-entry lets another profile's edit button restart the session; idle
+        # sessions expire (the timeout needs the job-queue extra of PTB). Menu
+        # buttons end the session rather than being saved as profile text.
+        admin_edit_conv = ConversationHandler(
+            entry_points=[CallbackQueryHandler(handlers.admin_edit_profile_start, pattern=r'^admin:edit:(?!cancel$)')],
+            states={
+                handlers.ADMIN_EDIT_WAIT_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND & ~MAIN_MENU_TEXT, handlers.admin_receive_profile_edit)],
+                ConversationHandler.TIMEOUT: [TypeHandler(Update, handlers.admin_edit_profile_timeout)],
+            },
+            fallbacks=[
+                CallbackQueryHandler(handlers.admin_edit_profile_cancel, pattern=r'^admin:edit:cancel$'),
+                MessageHandler(MAIN_MENU_TEXT, handlers.admin_edit_profile_menu),
+            ],
+            allow_reentry=True,
+            conversation_timeout=config.ADMIN_EDIT_TIMEOUT_SECONDS,
+        )
+        app.add_handler(admin_edit_conv)
+
         # ========== COMMAND HANDLERS ==========
         # Command handlers
         app.add_handler(CommandHandler('start', handlers.start))
@@ -186,58 +287,18 @@ def main():
 
         # ========== MENU BUTTON HANDLERS (fixed strings only) ==========
         # Menu messages
-        app.add_handler(MessageHandler(filters.Regex('^Информация о пользователях$'), handlers.users_list_entry))
-        app.add_handler(MessageHandler(filters.Regex('^Информация о чате$'), handlers.chat_info_cmd))
-        app.add_handler(MessageHandler(filters.Regex('^Правила$'), handlers.rules_entry))
-        app.add_handler(MessageHandler(filters.Regex('^Админы$'), handlers.admins_list_entry))
-        app.add_handler(MessageHandler(filters.Regex('^Анкета$'), handlers.profile_menu_entry))
-        app.add_handler(MessageHandler(filters.Regex('^Админ панель$'), handlers.admin_panel_entry))
-        app.add_handler(MessageHandler(filters.Regex('^AFK$'), handlers.afk_start))
-        app.add_handler(MessageHandler(filters.Regex('^Заявка на админа$'), handlers.admin_app_start))
-
-        # ========== CALLBACK QUERY HANDLERS ==========
-        # Callback handlers
-        app.add_handler(CallbackQueryHandler(handlers.view_profile_cb, pattern=r'^view:'))
-        app.add_handler(CallbackQueryHandler(handlers.back_to_users, pattern=r'^back:users$|^back:menu$|^back:add_new$|^back:profiles$|^back:manage_profiles$'))
-        app.add_handler(CallbackQueryHandler(handlers.delete_profile_cb, pattern=r'^delete:'))
-        app.add_handler(CallbackQueryHandler(handlers.delete_profile_confirm_cb, pattern=r'^delete_confirm:'))
-        # Profile menu callbacks
-        app.add_handler(CallbackQueryHandler(handlers.profile_new_start_cb, pattern=r'^profile:new_start$'))
-        # Admin panel callbacks
-        # Profile edit from profile view (user clicks 'Редактировать' next to profile)
-        app.add_handler(CallbackQueryHandler(handlers.edit_profile_cb, pattern=r'^edit:'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_reports_view, pattern=r'^admin:reports$'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_clear_reports, pattern=r'^admin:clear_reports$'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_new_profiles_view, pattern=r'^admin:new_profiles$'))
-        # admin_manage_profiles also handles pagination callbacks like admin:manage_profiles:page:N
-        app.add_handler(CallbackQueryHandler(handlers.admin_manage_profiles, pattern=r'^admin:manage_profiles(:page:\d+)?$'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_profile_action, pattern=r'^admin:profile:'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_edit_profile_start, pattern=r'^admin:edit:'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_delete_profile, pattern=r'^admin:delete:'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_afk_requests, pattern=r'^admin:afk_requests$'))
-        app.add_handler(CallbackQueryHandler(handlers.admin_admin_applications, pattern=r'^admin:admin_applications$'))
-        # review callbacks (accept/reject)
-        app.add_handler(CallbackQueryHandler(handlers.admin_review_cb, pattern=r'^review:'))
-        # callback for choosing category in report flow
-        app.add_handler(CallbackQueryHandler(handlers.report_select_cb, pattern=r'^report:'))
-        # new profile inline callbacks
-        app.add_handler(CallbackQueryHandler(handlers.new_profile_confirm_cb, pattern=r'^new:confirm$'))
-        app.add_handler(CallbackQueryHandler(handlers.new_profile_cancel_cb, pattern=r'^new:cancel$'))
-        # edit profile inline callbacks
-        app.add_handler(CallbackQueryHandler(handlers.edit_profile_confirm_cb, pattern=r'^edit:confirm$'))
-        app.add_handler(CallbackQueryHandler(handlers.edit_profile_cancel_cb, pattern=r'^edit:cancel$'))
-
-        # ========== GLOBAL TEXT HANDLERS (LOW PRIORITY) ==========
-        # These are fallback handlers that process any remaining TEXT messages.
-
-        # Try to auto-process freeform profile submissions (private chat) before generic admin edit hook
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.try_auto_profile_submit))
-
-        # admin profile editing hook
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.admin_receive_profile_edit))
-
-        # admin editing hook
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.admin_receive_edit))
+        for text, menu_handler in handlers.MENU_BUTTONS.items():
+            app.add_handler(MessageHandler(filters.Text([text]), menu_handler))
+
+        # ========== CALLBACK QUERY HANDLER ==========
+        # One handler for every callback not owned by a conversation;
+        # cb_router picks the target from CALLBACK_ROUTES by prefix
+        app.add_handler(CallbackQueryHandler(cb_router, block=False))
+
+        # ========== GLOBAL TEXT HANDLER (LOW PRIORITY) ==========
+        # Single fallback for any remaining TEXT messages: freeform profile submission.
+        # Admin edits are owned by admin_edit_conv; user self-edits by edit_conv.
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.try_auto_profile_submit, block=False))
 
         logger.info('Bot ready, starting polling with optimizations')
         print("\n" + "="*70)
@@ -4,11 +4,11 @@ Protects against spam and handles API errors gracefully.
 """
 import asyncio
 import logging
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Callable, Any
+import math
+import time
+from typing import Callable, Any, Dict, List, Tuple
 from functools import wraps
-from telegram.error import TelegramError, RetryAfter
+from telegram.error import TelegramError, RetryAfter, NetworkError, BadRequest
 import config
 
 logger = logging.getLogger(__name__)
@@ -16,9 +16,12 @@ logger = logging.getLogger(__name__)
 
 class UserRateLimiter:
     """
-    Per-user rate limiter to prevent spam.
+    Per-user token-bucket rate limiter to prevent spam.
+    Each user costs a fixed [tokens, last_refill] pair regardless of traffic.
     """
     
+    __slots__ = ('max_rate', 'time_period', '_refill_rate', 'state', '_calls', '_last_sweep')
+    
     def __init__(self, max_rate: int = None, time_period: int = 1):
         """
         Args:
@@ -27,39 +30,67 @@ class UserRateLimiter:
         """
         self.max_rate = max_rate or config.RATE_LIMIT_PER_SECOND
         self.time_period = time_period
-        self.requests = defaultdict(list)
+        # tokens regained per second, computed once instead of per request
+        self._refill_rate = self.max_rate / time_period
+        # user_id -> [tokens, last_refill] (list so it can be updated in place)
+        self.state: Dict[int, List[float]] = {}
+        # Idle users are evicted periodically so memory tracks active users only
+        self._calls = 0
+        self._last_sweep = time.monotonic()
     
-    def is_allowed(self, user_id: int) -> bool:
-        """Check if user is allowed to make request"""
-        now = datetime.now()
-        cutoff = now - timedelta(seconds=self.time_period)
+    def _sweep(self, now: float) -> None:
+        """Drop users idle for 5 periods (their bucket would be full again anyway)"""
+        cutoff = now - 5 * self.time_period
+        stale = [uid for uid, s in self.state.items() if s[1] < cutoff]
+        for uid in stale:
+            del self.state[uid]
+        self._calls = 0
+        self._last_sweep = now
+        if stale:
+            logger.debug('Rate limiter evicted %d idle users', len(stale))
+    
+    def try_acquire(self, user_id: int) -> Tuple[bool, int]:
+        """
+        Take one token for the user in a single state lookup.
         
-        # Remove old requests outside the window
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if req_time > cutoff
-        ]
+        Returns:
+            (True, 0) if allowed, else (False, seconds until the next token)
+        """
+        now = time.monotonic()
+        self._calls += 1
+        if self._calls >= 1000 or now - self._last_sweep >= 60:
+            self._sweep(now)
+        s = self.state.get(user_id)
+        if s is None:
+            self.state[user_id] = [self.max_rate - 1.0, now]
+            return True, 0
         
-        # Check if limit exceeded
-        if len(self.requests[user_id]) >= self.max_rate:
-            return False
+        # Refill proportionally to the time since the last request
+        tokens = s[0] + (now - s[1]) * self._refill_rate
+        if tokens > self.max_rate:
+            tokens = self.max_rate
+        s[1] = now
+        if tokens < 1.0:
+            s[0] = tokens
+            return False, math.ceil((1.0 - tokens) / self._refill_rate)
         
-        # Record this request
-        self.requests[user_id].append(now)
-        return True
+        s[0] = tokens - 1.0
+        return True, 0
+    
+    def is_allowed(self, user_id: int) -> bool:
+        """Check if user is allowed to make request"""
+        return self.try_acquire(user_id)[0]
     
     def get_reset_time(self, user_id: int) -> int:
         """Get seconds until user can make next request"""
-        if not self.requests[user_id]:
+        s = self.state.get(user_id)
+        if s is None or s[0] >= 1.0:
             return 0
-        
-        oldest = self.requests[user_id][0]
-        reset = oldest + timedelta(seconds=self.time_period)
-        now = datetime.now()
-        
-        if reset > now:
-            return int((reset - now).total_seconds()) + 1
-        return 0
+        return math.ceil((1.0 - s[0]) / self._refill_rate)
+    
+    def reset(self, user_id: int) -> None:
+        """Forget a user's request history"""
+        self.state.pop(user_id, None)
 
 
 # Global rate limiter
@@ -95,8 +126,11 @@ async def retry_telegram_request(
             return await func(*args, **kwargs)
         
         except RetryAfter as e:
-            # Telegram throttling - wait and retry
-            wait_time = e.retry_after + 1
+            # Telegram throttling - wait and retry, but never longer than the cap
+            last_error = e
+            wait_time = min(e.retry_after + 1, config.MAX_RETRY_AFTER_SECONDS)
+            if e.retry_after > config.MAX_RETRY_AFTER_SECONDS:
+                logger.warning('Clamping RetryAfter %ss -> %ss', e.retry_after, wait_time)
             logger.warning(
                 f'Rate limited by Telegram, waiting {wait_time}s '
                 f'(attempt {attempt + 1}/{max_retries})'
@@ -104,6 +138,10 @@ async def retry_telegram_request(
             await asyncio.sleep(wait_time)
         
         except TelegramError as e:
+            # BadRequest subclasses NetworkError in PTB but will never succeed on retry;
+            # the same goes for Forbidden and other non-network errors
+            if not isinstance(e, NetworkError) or isinstance(e, BadRequest):
+                raise
             last_error = e
             if attempt < max_retries - 1:
                 wait_time = backoff_factor ** attempt
@@ -177,8 +215,8 @@ def check_rate_limit(func):
         if not user_id:
             return await func(update, context, *args, **kwargs)
         
-        if not rate_limiter.is_allowed(user_id):
-            reset_time = rate_limiter.get_reset_time(user_id)
+        allowed, reset_time = rate_limiter.try_acquire(user_id)
+        if not allowed:
             message = f'⏳ Слишком много запросов. Попробуйте через {reset_time} сек.'
             
             try:
@@ -179,7 +179,7 @@ def test_rate_limiting():
         return False
     
     # Test 2: Rate limit exceeded
-    rate_limiter.requests[user_id] = []  # Reset for clean test
+    rate_limiter.reset(user_id)  # Reset for clean test
     for i in range(15):
         rate_limiter.is_allowed(user_id)
     
@@ -0,0 +1,41 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import batch_writer
+
+
+class TestReviewBatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_lone_review_skips_window(self):
+        batcher = batch_writer.ReviewBatcher(flush_ms=5000)
+        with mock.patch.object(batch_writer.db, 'apply_reviews', return_value=[True]) as apply:
+            ok = await asyncio.wait_for(batcher.submit(1, 'accept', 7), timeout=1)
+            await batcher.close()
+        self.assertTrue(ok)
+        apply.assert_called_once_with([(1, 'accept', 7)])
+
+    async def test_cancel_before_flush_applies_on_close(self):
+        batcher = batch_writer.ReviewBatcher(flush_ms=5000)
+        with mock.patch.object(batch_writer.db, 'apply_reviews', side_effect=lambda r: [True] * len(r)) as apply:
+            # two queued reviews open the collection window
+            first = asyncio.ensure_future(batcher.submit(1, 'accept', 7))
+            second = asyncio.ensure_future(batcher.submit(2, 'reject', 7))
+            await asyncio.sleep(0.05)
+            await batcher.close()
+            results = await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+        self.assertEqual(results, [True, True])
+        apply.assert_called_once_with([(1, 'accept', 7), (2, 'reject', 7)])
+
+
+class TestReportsWriter(unittest.IsolatedAsyncioTestCase):
+    async def test_cancel_before_flush_writes_on_close(self):
+        writer = batch_writer.ReportsWriter(flush_ms=5000)
+        with mock.patch.object(batch_writer.db, 'add_reports', return_value=1) as add:
+            await writer.submit({'reason': 'r1'})
+            await asyncio.sleep(0.05)
+            await writer.close()
+        add.assert_called_once_with([{'reason': 'r1'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cache_manager import PersistentProfileCache, RedisProfileCache
+
+try:
+    import fakeredis
+    import msgpack  # noqa: F401
+    import zstandard  # noqa: F401
+except ImportError:  # optional dependency
+    fakeredis = None
+
+
+class TestPersistentProfileCacheLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'profiles_cache.json')
+        self.caches = []
+
+    def tearDown(self):
+        for c in self.caches:
+            c.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _open(self):
+        c = PersistentProfileCache(self.path)
+        self.caches.append(c)
+        return c
+
+    def _snapshot(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)['cache']
+
+    def test_set_appends_without_rewriting_snapshot(self):
+        c = self._open()
+        c.set(1, {'username': 'a'})
+        self.assertEqual(self._snapshot(), {})
+        self.assertGreater(os.path.getsize(c.log_file), 0)
+        c.compact()
+        self.assertEqual(self._snapshot(), {'1': {'username': 'a'}})
+
+    def test_updates_replayed_after_restart(self):
+        c = self._open()
+        c.set(1, {'username': 'a', 'status': 'pending'})
+        c.set(2, {'username': 'b'})
+        c.update(1, {'status': 'approved'})
+        c.invalidate(2)
+        # everything lives only in the log until compaction
+        self.assertEqual(self._snapshot(), {})
+        self.assertEqual(self._open().get(1), {'username': 'a', 'status': 'approved'})
+        self.assertIsNone(self.caches[-1].get(2))
+
+    def test_torn_and_corrupt_lines_skipped(self):
+        c = self._open()
+        c.set(1, {'username': 'a'})
+        c.update(1, {'age': 20})
+        with open(c.log_file, 'a', encoding='utf-8') as f:
+            f.write('{"op": "update", "k": "x", "v": {"age": 1}}\n')
+            f.write('{"op": "del"}\n')
+            f.write('[1, 2]\n')
+            f.write('{"op": "update", "k": 1, "v": {"city": "Баку"}}\n')
+            f.write('{"op": "del", "k": 1')  # torn final line
+        reloaded = self._open()
+        self.assertEqual(reloaded.get(1), {'username': 'a', 'age': 20, 'city': 'Баку'})
+
+    def test_compaction_after_threshold_and_on_close(self):
+        c = self._open()
+        c.COMPACT_EVERY = 4
+        c.set(1, {'username': 'a', 'n': 0})
+        c.update(1, {'n': 1})
+        c.update(1, {'n': 2})
+        self.assertEqual(self._snapshot(), {})
+        c.update(1, {'n': 3})
+        self.assertEqual(self._snapshot()['1']['n'], 3)
+        self.assertEqual(os.path.getsize(c.log_file), 0)
+        c.update(1, {'n': 4})
+        c.close()
+        self.assertEqual(self._snapshot()['1']['n'], 4)
+        self.assertEqual(os.path.getsize(c.log_file), 0)
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis, msgpack or zstandard not installed')
+class TestRedisProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        self.cache = RedisProfileCache('redis://fake', client=self.client, prefix='{t*}:')
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_set_get_update(self):
+        self.cache.set(1, {'username': 'a', 'status': 'pending'})
+        self.cache.update(1, {'status': 'approved'})
+        self.assertEqual(self.cache.get(1), {'username': 'a', 'status': 'approved'})
+        self.assertTrue(self.cache.exists(1))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_delete_by_username_and_invalidate_all(self):
+        self.cache.set(1, {'username': 'a'})
+        self.cache.set(2, {'username': 'b'})
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.get_all(), [{'username': 'b'}])
+        self.cache.invalidate_all()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_keys_are_namespaced(self):
+        self.client.set('profile:99', b'other app')
+        self.client.set('{tx}:profile:98', b'other prefix')
+        self.cache.set(1, {'username': 'a'})
+        self.assertTrue(self.client.exists('{t*}:profile:1'))
+        self.assertEqual(len(self.cache), 1)
+        self.cache.invalidate_all()
+        self.assertEqual(self.client.get('profile:99'), b'other app')
+        self.assertEqual(self.client.get('{tx}:profile:98'), b'other prefix')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,40 +1,25 @@
-import os
-import tempfile
 import unittest
+from uuid import uuid4
 
-import importlib
+import db as dbmod
 
 
 class TestDBSeed(unittest.TestCase):
+    def setUp(self):
+        # private in-memory DB per test; it is discarded when the last connection closes
+        self.conn = dbmod.get_conn('file:testdb_%s?mode=memory&cache=shared' % uuid4().hex)
+        dbmod.init_db(conn=self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
     def test_seed_profiles_created(self):
-        # use temporary DB path to avoid overwriting real db
-        import config
-        old_path = config.DB_PATH
-        fd, tmp = tempfile.mkstemp(suffix='.sqlite')
-        os.close(fd)
-        config.DB_PATH = tmp
-        # reload db module
-        import db as dbmod
-        importlib.reload(dbmod)
-        dbmod.init_db()
-        profiles = dbmod.get_all_profiles()
+        profiles = dbmod.get_all_profiles(conn=self.conn)
         usernames = {p['username'] for p in profiles}
         expected = {'SkeeYee_j','Cannella_S','nurkotik','FAFNIR5','thebitsamuraiizz','doob_rider','Tecno2027','kixxzzl','L9g9nda'}
         self.assertTrue(expected.issubset(usernames))
-        # cleanup
-        os.remove(tmp)
-        config.DB_PATH = old_path
 
     def test_reports_insert_and_fetch(self):
-        import config
-        old_path = config.DB_PATH
-        fd, tmp = tempfile.mkstemp(suffix='.sqlite')
-        os.close(fd)
-        config.DB_PATH = tmp
-        import db as dbmod
-        importlib.reload(dbmod)
-        dbmod.init_db()
-
         r = {
             'reporter_id': 111,
             'reporter_username': 'reporter1',
@@ -44,24 +29,11 @@ class TestDBSeed(unittest.TestCase):
             'attachments': None,
             'created_at': '2025-01-01T00:00:00'
         }
-        rid = dbmod.add_report(r)
-        reports = dbmod.get_reports()
+        rid = dbmod.add_report(r, conn=self.conn)
+        reports = dbmod.get_reports(conn=self.conn)
         self.assertTrue(any(rep['id'] == rid for rep in reports))
 
-        # cleanup
-        os.remove(tmp)
-        config.DB_PATH = old_path
-
     def test_add_profile_status_and_review(self):
-        import config
-        old_path = config.DB_PATH
-        fd, tmp = tempfile.mkstemp(suffix='.sqlite')
-        os.close(fd)
-        config.DB_PATH = tmp
-        import db as dbmod
-        importlib.reload(dbmod)
-        dbmod.init_db()
-
         # create a user-submitted profile -> status should default to 'pending'
         p = {
             'username': 'test_user_1',
@@ -70,20 +42,25 @@ class TestDBSeed(unittest.TestCase):
             'added_by': 'tester',
             'added_by_id': 12345,
         }
-        pid = dbmod.add_profile(p)
-        rec = dbmod.get_profile_by_id(pid)
+        pid = dbmod.add_profile(p, conn=self.conn)
+        rec = dbmod.get_profile_by_id(pid, conn=self.conn)
         self.assertIsNotNone(rec)
         self.assertEqual(rec.get('status'), 'pending')
 
         # accept the profile programmatically
-        ok = dbmod.update_profile_status_by_id(pid, 'approved')
+        ok = dbmod.update_profile_status_by_id(pid, 'approved', conn=self.conn)
         self.assertTrue(ok)
-        rec2 = dbmod.get_profile_by_id(pid)
+        rec2 = dbmod.get_profile_by_id(pid, conn=self.conn)
         self.assertEqual(rec2.get('status'), 'approved')
 
-        # cleanup
-        os.remove(tmp)
-        config.DB_PATH = old_path
+    def test_profile_columns_pending_user_added(self):
+        pid = dbmod.add_profile({'username': 'cols_user', 'age': 30, 'added_by': 'tester'}, conn=self.conn)
+        dbmod.add_profile({'username': 'cols_seed', 'added_by': 'seed'}, conn=self.conn)
+
+        cols = dbmod.get_profile_columns('pending', user_added_only=True, conn=self.conn)
+        self.assertEqual(cols['id'], [pid])
+        self.assertEqual(cols['username'], ['cols_user'])
+        self.assertEqual(cols['age'], [30])
 
 
 if __name__ == '__main__':
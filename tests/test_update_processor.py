@@ -0,0 +1,40 @@
+import asyncio
+import datetime
+import unittest
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerChatUpdateProcessor
+
+
+def _update(update_id, chat_id, user_id):
+    msg = Message(update_id, datetime.datetime.now(), Chat(chat_id, 'private'),
+                  from_user=User(user_id, 'u', False), text='x')
+    return Update(update_id, message=msg)
+
+
+class TestPerChatUpdateProcessor(unittest.IsolatedAsyncioTestCase):
+    async def _run(self, updates):
+        processor = PerChatUpdateProcessor(16)
+        log = []
+
+        async def handle(n):
+            log.append(('start', n))
+            await asyncio.sleep(0.01)
+            log.append(('end', n))
+
+        await asyncio.gather(*(processor.process_update(u, handle(u.update_id)) for u in updates))
+        return processor, log
+
+    async def test_same_chat_is_sequential(self):
+        processor, log = await self._run([_update(1, 10, 5), _update(2, 10, 5)])
+        self.assertEqual(log, [('start', 1), ('end', 1), ('start', 2), ('end', 2)])
+        self.assertEqual(processor._locks, {})
+
+    async def test_different_chats_overlap(self):
+        _, log = await self._run([_update(1, 10, 5), _update(2, 11, 6)])
+        self.assertEqual(log[:2], [('start', 1), ('start', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
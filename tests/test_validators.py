@@ -0,0 +1,76 @@
+import unittest
+
+import validators
+
+
+class TestForbiddenBackends(unittest.TestCase):
+    SAMPLES = [
+        'приветbot', 'bot', 'мой bot тут', 'ботbotбот', 'BOT!', 'robot', 'spam',
+        'чистый текст', 'phishing', 'xxxтекст', '18+',
+    ]
+
+    def test_regex_word_boundaries_are_unicode(self):
+        self.assertFalse(validators.FORBIDDEN_RE.search('приветbot'))
+        self.assertTrue(validators.FORBIDDEN_RE.search('привет bot'))
+
+    @unittest.skipIf(validators.FORBIDDEN_DB is None, 'hyperscan not installed')
+    def test_hyperscan_matches_regex(self):
+        for text in self.SAMPLES:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    validators.contains_forbidden(text),
+                    validators.FORBIDDEN_RE.search(text) is not None,
+                )
+
+    def test_lone_surrogate(self):
+        self.assertTrue(validators.contains_forbidden('spam \ud800'))
+        self.assertFalse(validators.contains_forbidden('текст \ud800'))
+
+
+def _is_spam_reference(text, threshold=0.5):
+    # original formula: caps and specials are counted separately, so a char
+    # that is both (e.g. circled capital letters) counts twice
+    if not text or len(text) < 5:
+        return False
+    caps_count = sum(1 for c in text if c.isupper())
+    special_count = sum(1 for c in text if not c.isalnum() and c != ' ')
+    return (caps_count + special_count) / len(text) > threshold
+
+
+class TestSpam(unittest.TestCase):
+    def test_uppercase_symbols_count_twice(self):
+        # 'ⒶⒷⒸ' are isupper() but not isalnum(): weight 2 each -> 6/11 > 0.5
+        text = 'ⒶⒷⒸ abcdefg'
+        self.assertTrue(_is_spam_reference(text))
+        self.assertTrue(validators.is_spam(text))
+        self.assertEqual(validators.is_spam_bulk([text]), [True])
+
+    def test_matches_reference(self):
+        samples = [
+            'Hello world', 'HELLO WORLD!!!', 'Привет, как дела?', 'ПРИВЕТ!!!',
+            '😀😀😀😀😀 hi', '中文中文中文', '🄰🄱🄲 text here', 'Ǆǅǆ abc', '\u3000\u3000ab cd',
+        ]
+        for text in samples:
+            for threshold in (0.2, 0.5):
+                with self.subTest(text=text, threshold=threshold):
+                    self.assertEqual(validators.is_spam(text, threshold), _is_spam_reference(text, threshold))
+
+
+class TestSpamBulk(unittest.TestCase):
+    TEXTS = [
+        '', 'abc', 'Hello world', 'HELLO WORLD!!!', '!!!!!!', 'Привет, как дела?',
+        'ПРИВЕТ!!!', '😀😀😀😀😀 hi', '中文中文中文', 'ⒶⒷⒸⒹⒺ', 'Ǆǅǆ abc', 'a\ud800bcdef',
+        'tab\tand\nnewline', 'x' * 50 + '!' * 60,
+    ]
+
+    def test_bulk_matches_single(self):
+        for threshold in (0.1, 0.5, 0.9):
+            with self.subTest(threshold=threshold):
+                self.assertEqual(
+                    validators.is_spam_bulk(self.TEXTS, threshold),
+                    [validators.is_spam(t, threshold) for t in self.TEXTS],
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
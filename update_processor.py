@@ -0,0 +1,52 @@
+"""
+Update processor that keeps per-conversation ordering under concurrency.
+Updates from different chats/users run in parallel; updates from the same
+chat and user run one after another, so ConversationHandler always sees the
+state left by the previous update.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional, Tuple
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _conversation_key(update: object) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """(chat_id, user_id) like ConversationHandler's default per_chat/per_user key"""
+    if not isinstance(update, Update):
+        return None
+    chat, user = update.effective_chat, update.effective_user
+    if chat is None and user is None:
+        return None
+    return (chat.id if chat else None, user.id if user else None)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Concurrent across chats, sequential within one chat/user pair"""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # key -> (lock, number of updates holding or waiting for it)
+        self._locks: Dict[Tuple, list] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _conversation_key(update)
+        if key is None:
+            await coroutine
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,13 +1,31 @@
+import html
 import logging
-from datetime import datetime
 import re
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
 
 AGE_RE = re.compile(r"\b([8-9][0-9]|[1-7]?\d)\b")
 TZ_RE = re.compile(r"(UTC)?\s*([+-]?\d{1,2})")
+# digit runs with the optional "UTC" prefix and sign TZ_RE accepts (age + timezone scan)
+NUM_RE = re.compile(r"(UTC\s*)?([+-]?)(\d+)")
+USER_RE = re.compile(r"@([A-Za-z0-9_]{1,32})")
+NAME_RE = re.compile(r"\b([А-ЯЁA-Z][а-яёa-z]+)\b")
+CITY_RE = re.compile(r"[,:]\s*([А-Яа-яЁёA-Za-z\- ]{3,40})")
+
+# country keywords; earlier entries win when several are mentioned
+COUNTRIES = ["Россия", "Украина", "Казахстан", "Беларусь", "Азербайджан"]
+_COUNTRY_BY_KEY = {c.lower(): c for c in COUNTRIES}
+_COUNTRY_PRIORITY = {c.lower(): i for i, c in enumerate(COUNTRIES)}
+# one scan over the lowercased text instead of a substring search per country
+COUNTRY_RE = re.compile('|'.join(re.escape(k) for k in _COUNTRY_BY_KEY))
+
+
+def _is_word_char(c: str) -> bool:
+    """Same test as the regex word class (for word-boundary checks around numbers)"""
+    return c.isalnum() or c == '_'
 
 
 def parse_profile_text(text: str) -> Dict[str, Any]:
@@ -17,23 +35,30 @@ def parse_profile_text(text: str) -> Dict[str, Any]:
     """
     data: Dict[str, Any] = {}
 
-    # age
-    m = AGE_RE.search(text)
-    if m:
-        age = int(m.group(1))
-        if 8 <= age <= 99:
-            data['age'] = age
-
-    # timezone
-    m = TZ_RE.search(text)
-    if m:
-        try:
-            offset = int(m.group(2))
+    # age and timezone in one pass over the digit runs: the first run gives the
+    # timezone (as TZ_RE would), the first standalone 1-2 digit number the age
+    # (as AGE_RE would); stop as soon as both are known
+    need_tz = need_age = True
+    n = len(text)
+    for m in NUM_RE.finditer(text):
+        digits = m.group(3)
+        if need_tz:
+            need_tz = False
+            offset = int(m.group(2) + digits[:2])
             data['tz_offset'] = offset
             text_tz = f"UTC{offset:+d}" if m.group(1) else (f"{offset:+d} к мск" if offset != 0 else "UTC+0")
             data['timezone'] = text_tz
-        except Exception:
-            pass
+        if need_age:
+            start, end = m.span(3)
+            if ((start == 0 or not _is_word_char(text[start - 1]))
+                    and (end == n or not _is_word_char(text[end]))
+                    and AGE_RE.fullmatch(digits)):
+                need_age = False
+                age = int(digits)
+                if 8 <= age <= 99:
+                    data['age'] = age
+        if not need_age:
+            break
 
     # languages - comma separated list of words (simple heuristic)
     if ',' in text:
@@ -42,28 +67,28 @@ def parse_profile_text(text: str) -> Dict[str, Any]:
             data['languages'] = ', '.join(parts[:5])
 
     # username-like tokens: @username
-    m = re.search(r"@([A-Za-z0-9_]{1,32})", text)
-    if m:
-        data['username'] = m.group(1)
+    if '@' in text:
+        m = USER_RE.search(text)
+        if m:
+            data['username'] = m.group(1)
 
     # name (simple heuristic: Words with capitalized first letter - pick first)
-    m = re.search(r"\b([А-ЯЁA-Z][а-яёa-z]+)\b", text)
+    m = NAME_RE.search(text)
     if m:
         data['name'] = m.group(1)
 
     # country / city simple heuristics (keywords)
-    countries = ["Россия", "Украина", "Казахстан", "Беларусь", "Азербайджан"]
-    for c in countries:
-        if c.lower() in text.lower():
-            data['country'] = c
-            break
+    hits = COUNTRY_RE.findall(text.lower())
+    if hits:
+        data['country'] = _COUNTRY_BY_KEY[min(hits, key=_COUNTRY_PRIORITY.__getitem__)]
 
     # city guess: word after comma or after country
-    city_m = re.search(r"[,:]\s*([А-Яа-яЁёA-Za-z\- ]{3,40})", text)
+    city_m = CITY_RE.search(text)
     if city_m:
-        candidate = city_m.group(1).strip()
-        if len(candidate) < 40 and len(candidate) > 2 and not candidate.isdigit():
-            data['city'] = candidate.split('\n')[0].strip()
+        # partition takes the first line without building a list
+        candidate = city_m.group(1).strip().partition('\n')[0]
+        if 2 < len(candidate) < 40 and not candidate.isdigit():
+            data['city'] = candidate
 
     # note: remainder length limited
     if len(text) > 200:
@@ -81,8 +106,31 @@ def parse_profile_text(text: str) -> Dict[str, Any]:
     return {'data': data, 'need': need}
 
 
+# (second, 'YYYY-MM-DDTHH:MM:SS.') for the last second seen; one tuple so
+# threads never pair a stale prefix with a newer second
+_iso_prefix = (-1, '')
+
+
 def iso_now() -> str:
-    return datetime.utcnow().isoformat()
+    """Current UTC time as 'YYYY-MM-DDTHH:MM:SS.ffffff'; the date part is formatted once per second"""
+    global _iso_prefix
+    secs, us = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_secs, prefix = _iso_prefix
+    if cached_secs != secs:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S.', time.gmtime(secs))
+        _iso_prefix = (secs, prefix)
+    return f"{prefix}{us:06d}"
+
+
+# (key, label) for the single-line card fields, in display order
+_CARD_FIELDS = (
+    ('name', "📝 <b>Имя:</b> "),
+    ('age', "🎂 <b>Возраст:</b> "),
+    ('country', "🌍 <b>Страна:</b> "),
+    ('city', "🏙️ <b>Город:</b> "),
+    ('timezone', "🕐 <b>Часовой пояс:</b> "),
+    ('languages', "💬 <b>Языки:</b> "),
+)
 
 
 def short_profile_card(profile: Dict[str, Any]) -> str:
@@ -90,51 +138,56 @@ def short_profile_card(profile: Dict[str, Any]) -> str:
 
     Escape user-provided fields for safe HTML output.
     """
-    import html as _html
-    lines = []
-
-    # Helper to escape or return empty
-    def esc(val):
-        if val is None:
-            return ''
-        return _html.escape(str(val))
+    _escape = html.escape
+    get = profile.get
 
     # Username
-    if profile.get('username'):
-        lines.append(f"👤 <b>@{esc(profile.get('username'))}</b>")
-    else:
-        lines.append("👤 (без ника)")
-
-    # Name
-    if profile.get('name'):
-        lines.append(f"📝 <b>Имя:</b> {esc(profile.get('name'))}")
-
-    # Age
-    if profile.get('age') is not None:
-        lines.append(f"🎂 <b>Возраст:</b> {esc(profile.get('age'))}")
-
-    # Country
-    if profile.get('country'):
-        lines.append(f"🌍 <b>Страна:</b> {esc(profile.get('country'))}")
-
-    # City
-    if profile.get('city'):
-        lines.append(f"🏙️ <b>Город:</b> {esc(profile.get('city'))}")
+    username = get('username')
+    lines = [f"👤 <b>@{_escape(str(username))}</b>" if username else "👤 (без ника)"]
 
-    # Timezone
-    if profile.get('timezone'):
-        lines.append(f"🕐 <b>Часовой пояс:</b> {esc(profile.get('timezone'))}")
-
-    # Languages
-    if profile.get('languages'):
-        lines.append(f"💬 <b>Языки:</b> {esc(profile.get('languages'))}")
+    # One pass over the simple fields; age 0 is still shown
+    for key, label in _CARD_FIELDS:
+        val = get(key)
+        if val or (key == 'age' and val is not None):
+            lines.append(label + _escape(str(val)))
 
     # Note (preserve all line breaks)
-    if profile.get('note'):
-        note = esc(profile.get('note', '')).strip()
+    note = get('note')
+    if note:
+        note = _escape(str(note)).strip()
         if note:
-            lines.append(f"📋 <b>Заметка:</b>")
+            lines.append("📋 <b>Заметка:</b>")
             # preserve original newlines (escaped already)
             lines.extend(note.split('\n'))
 
     return '\n'.join(lines)
+
+
+def render_cards_bulk(columns: Dict[str, List[Any]]) -> List[str]:
+    """Render short_profile_card output for a column-oriented batch of profiles.
+
+    columns maps field name to a list of values (see db.get_profile_columns);
+    cards are built field by field instead of one dict at a time.
+    """
+    _escape = html.escape
+    rows = [[f"👤 <b>@{_escape(str(u))}</b>" if u else "👤 (без ника)"] for u in columns['username']]
+
+    for key, label in _CARD_FIELDS:
+        values = columns.get(key)
+        if values is None:
+            continue
+        is_age = key == 'age'
+        for lines, val in zip(rows, values):
+            if val or (is_age and val is not None):
+                lines.append(label + _escape(str(val)))
+
+    notes = columns.get('note')
+    if notes is not None:
+        for lines, note in zip(rows, notes):
+            if note:
+                note = _escape(str(note)).strip()
+                if note:
+                    lines.append("📋 <b>Заметка:</b>")
+                    lines.extend(note.split('\n'))
+
+    return ['\n'.join(lines) for lines in rows]
@@ -4,22 +4,116 @@ Ensures data integrity and security.
 """
 import re
 import logging
-from typing import Tuple
+from typing import List, Tuple
 import config
 
+try:
+    import hyperscan
+except ImportError:  # optional dependency
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
 # Forbidden words/patterns
 FORBIDDEN_PATTERNS = [
-    r'spam', r'phishing', r'scam', r'bot', r'hack',
+    r'spam', r'phish', r'scam', r'\bbot\b', r'hack',
     r'xxx', r'porn', r'18\+', r'nudes',
 ]
+# All patterns in one alternation: a single case-insensitive scan per text
+FORBIDDEN_RE = re.compile('|'.join(FORBIDDEN_PATTERNS), re.IGNORECASE)
+
+
+def _hs_expression(pattern: str) -> bytes:
+    """Hyperscan form of a pattern: it rejects \\b in UCP mode, so a leading or
+    trailing \\b becomes a Unicode non-word character or the text edge
+    (fine for a yes/no scan, which does not need exact match bounds)"""
+    if pattern.startswith(r'\b'):
+        pattern = r'(?:^|\W)' + pattern[2:]
+    if pattern.endswith(r'\b'):
+        pattern = pattern[:-2] + r'(?:\W|$)'
+    return pattern.encode()
+
+
+def _compile_forbidden_db():
+    """Compile FORBIDDEN_PATTERNS into a Hyperscan block-mode database"""
+    n = len(FORBIDDEN_PATTERNS)
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    db.compile(
+        expressions=[_hs_expression(p) for p in FORBIDDEN_PATTERNS],
+        ids=list(range(n)),
+        elements=n,
+        # UCP gives \W Unicode word semantics, as in FORBIDDEN_RE (e.g. 'приветbot' is not 'bot')
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP] * n,
+    )
+    return db
+
+
+# Hyperscan (SIMD multi-pattern matcher) when installed, FORBIDDEN_RE otherwise
+FORBIDDEN_DB = _compile_forbidden_db() if hyperscan is not None else None
 
-# URL pattern for detection and replacement
+
+def _stop_on_match(*_args) -> bool:
+    return True  # any hit is enough; terminates the scan
+
+
+def contains_forbidden(text: str) -> bool:
+    """Check text against FORBIDDEN_PATTERNS (case-insensitive)"""
+    if FORBIDDEN_DB is not None:
+        try:
+            data = text.encode('utf-8')
+        except UnicodeEncodeError:
+            # lone surrogates have no valid UTF-8 form; the regex handles them
+            return FORBIDDEN_RE.search(text) is not None
+        try:
+            FORBIDDEN_DB.scan(data, match_event_handler=_stop_on_match)
+            return False
+        except hyperscan.ScanTerminated:
+            return True
+        except hyperscan.HyperscanError as e:
+            logger.warning('Hyperscan scan failed, using regex: %s', e)
+    return FORBIDDEN_RE.search(text) is not None
+
+# URL pattern for detection and replacement (RFC 3986 characters, one class)
 URL_PATTERN = re.compile(
-    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+    r"https?://[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=%]+"
 )
 
+# is_spam counts uppercase letters and special chars (not alnum, not space).
+# Below U+0530 (Latin, Cyrillic) those chars are listed in one precompiled
+# class so the regex engine does the counting; anything beyond that range is
+# matched too and classified in Python (rare: emoji, CJK, ...).
+_SPAM_TABLE_LIMIT = '\u0530'
+_SUSPICIOUS_RE = re.compile('[{}{}-\U0010ffff]'.format(
+    ''.join(
+        re.escape(chr(cp)) for cp in range(ord(_SPAM_TABLE_LIMIT))
+        if chr(cp) != ' ' and (chr(cp).isupper() or not chr(cp).isalnum())
+    ),
+    _SPAM_TABLE_LIMIT,
+))
+# (numpy, lookup table with the same classification) for is_spam_bulk; numpy
+# is imported on the first bulk call so importing validators stays cheap.
+# False once the import has failed.
+_BULK_STATE = None
+
+
+def _bulk_state():
+    global _BULK_STATE
+    if _BULK_STATE is None:
+        try:
+            import numpy as np
+        except ImportError:  # optional dependency
+            _BULK_STATE = False
+        else:
+            _BULK_STATE = (np, np.array(
+                [bool(_SUSPICIOUS_RE.match(chr(cp))) for cp in range(ord(_SPAM_TABLE_LIMIT))]
+            ))
+    return _BULK_STATE
+
+# Profile length limits bound once at import (saves the config attribute lookups
+# per call); changes to config.MIN/MAX_PROFILE_LENGTH need a reload of this module
+_MIN = config.MIN_PROFILE_LENGTH
+_MAX = config.MAX_PROFILE_LENGTH
+
 
 def validate_profile_text(text: str) -> Tuple[bool, str | None]:
     """
@@ -31,19 +125,25 @@ def validate_profile_text(text: str) -> Tuple[bool, str | None]:
     if not text:
         return False, "Текст не может быть пустым"
     
-    text = text.strip()
+    # Length without surrounding whitespace, without copying the text
+    n = len(text)
+    i = 0
+    while i < n and text[i].isspace():
+        i += 1
+    j = n
+    while j > i and text[j - 1].isspace():
+        j -= 1
+    stripped_len = j - i
     
-    if len(text) < config.MIN_PROFILE_LENGTH:
-        return False, f"Минимум {config.MIN_PROFILE_LENGTH} символов"
+    if stripped_len < _MIN:
+        return False, f"Минимум {_MIN} символов"
     
-    if len(text) > config.MAX_PROFILE_LENGTH:
-        return False, f"Максимум {config.MAX_PROFILE_LENGTH} символов"
+    if stripped_len > _MAX:
+        return False, f"Максимум {_MAX} символов"
     
     # Check for forbidden content
-    text_lower = text.lower()
-    for pattern in FORBIDDEN_PATTERNS:
-        if re.search(pattern, text_lower):
-            return False, "Найден запрещенный контент"
+    if contains_forbidden(text):
+        return False, "Найден запрещенный контент"
     
     return True, None
 
@@ -64,7 +164,8 @@ def sanitize_text(text: str, remove_urls: bool = False) -> str:
     
     text = text.strip()
     
-    if remove_urls:
+    # Cheap substring check first: most texts have no URL at all
+    if remove_urls and 'http' in text:
         text = URL_PATTERN.sub('[ссылка]', text)
     
     # Remove excessive whitespace
@@ -159,9 +260,50 @@ def is_spam(text: str, threshold: float = 0.5) -> bool:
     if not text or len(text) < 5:
         return False
     
-    caps_count = sum(1 for c in text if c.isupper())
-    special_count = sum(1 for c in text if not c.isalnum() and c != ' ')
+    found = _SUSPICIOUS_RE.findall(text)
+    suspicious = len(found)
+    if max(found, default='') >= _SPAM_TABLE_LIMIT:
+        # Non-table chars were matched unconditionally (counted once); recount
+        # them as caps + special: 0 for innocent ones, 2 for uppercase symbols
+        # such as circled capitals, which count as both
+        suspicious += sum(c.isupper() + (not c.isalnum()) - 1 for c in found if c >= _SPAM_TABLE_LIMIT)
     
-    ratio = (caps_count + special_count) / len(text)
+    ratio = suspicious / len(text)
     
     return ratio > threshold
+
+
+def is_spam_bulk(texts: List[str], threshold: float = 0.5) -> List[bool]:
+    """
+    is_spam for many texts at once, e.g. when rescanning stored profiles.
+    Classifies all characters in one numpy pass when numpy is installed.
+    
+    Returns:
+        One flag per text, same results as is_spam
+    """
+    state = _bulk_state()
+    if not state or not texts:
+        return [is_spam(t, threshold) for t in texts]
+    np, lut = state
+    
+    texts = [t or '' for t in texts]
+    joined = ''.join(texts)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    
+    # One code point per character, so offsets match str indexes
+    cps = np.frombuffer(joined.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    limit = ord(_SPAM_TABLE_LIMIT)
+    in_table = cps < limit
+    # per-char weight: table chars are never both uppercase and special, so 0/1
+    suspicious = np.zeros(cps.shape, dtype=np.int64)
+    suspicious[in_table] = lut[cps[in_table]]
+    for i in np.flatnonzero(~in_table).tolist():
+        c = joined[i]
+        suspicious[i] = c.isupper() + (not c.isalnum())
+    
+    # Per-text counts from a prefix sum (handles empty texts, unlike reduceat)
+    prefix = np.concatenate(([0], np.cumsum(suspicious)))
+    ends = np.cumsum(lengths)
+    counts = prefix[ends] - prefix[ends - lengths]
+    ratios = counts / np.maximum(lengths, 1)
+    return ((lengths >= 5) & (ratios > threshold)).tolist()